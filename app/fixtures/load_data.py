@@ -2,6 +2,7 @@ from sqlalchemy.orm import Session
 from sqlalchemy import any_
 from ..database import get_db, engine
 from .. import models
+from ..services import backfill_nutrition, normalize_name
 import json
 # D:\UNITY\mp\mealplanner\app\fixtures\ingridients.json
 
@@ -23,20 +24,21 @@ def load_fixtures():
     db_query = db.query(models.Ingredient)
     # db_query = db_query.filter(any_([models.Ingredient.name.ilike(f"%{name}%") for name in names]))
 
+    # Keyed by normalized name, so "Яйця" and "яйця " are one ingredient
     ingredients = {}
     for exists in db_query.all():
-        ingredients[exists.name.capitalize()] = exists
+        ingredients.setdefault(normalize_name(exists.name), exists)
 
-    ingredients = {}
     for ing_data in ingredients_data:
-        ing_data["name"] = ing_data["name"].capitalize()
-        if ing_data["name"] in ingredients:
+        ing_data["name"] = ' '.join(ing_data["name"].split()).capitalize()
+        key = normalize_name(ing_data["name"])
+        if key in ingredients:
             continue
         ingredient = models.Ingredient(**ing_data)
         db.add(ingredient)
         db.commit()
         db.refresh(ingredient)
-        ingredients[ing_data['name']] = ingredient
+        ingredients[key] = ingredient
     
     # Load recipes
     with open(REC_PATH, 'r') as f:
@@ -51,8 +53,7 @@ def load_fixtures():
         db.refresh(recipe)
         
         for ing_data in recipe_ingredients:
-            ing_name = ing_data.pop('name').capitalize()
-            ingredient = ingredients[ing_name]
+            ingredient = ingredients[normalize_name(ing_data.pop('name'))]
             recipe_ing = models.RecipeIngredient(
                 recipe_id=recipe.id,
                 ingredient_id=ingredient.id,
@@ -62,6 +63,8 @@ def load_fixtures():
         
         db.commit()
     
+    # Roll up each new recipe's nutrition from its ingredients
+    backfill_nutrition(db)
     db.close()
 
 if __name__ == "__main__":
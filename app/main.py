@@ -2,7 +2,7 @@ from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from .routers import recipes, meal_plans, shopping_lists, ingredients
 from .database import engine
-from . import models
+from . import migrations, models
 
 app = FastAPI(title="Meal Planning API")
 
@@ -13,11 +13,13 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],  # Allows all methods
     allow_headers=["*"],  # Allows all headers
+    expose_headers=["ETag", "X-Next-Cursor"],
 )
 
 # Create database tables
 # models.Base.metadata.drop_all(bind=engine)
 models.Base.metadata.create_all(bind=engine)
+migrations.upgrade(engine)
 
 # Include routers
 app.include_router(recipes.router)
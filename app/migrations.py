@@ -0,0 +1,85 @@
+from sqlalchemy import text
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+from .services import backfill_nutrition, recipe_search
+
+# create_all only creates missing tables, so columns and indexes added to
+# existing tables are applied here. Every statement must be idempotent;
+# they run on each startup against PostgreSQL. Other databases (SQLite
+# in development) are expected to be created fresh by create_all.
+POSTGRES_UPGRADES = [
+    "ALTER TABLE meal_plans ADD COLUMN IF NOT EXISTS entries_hash VARCHAR(64)",
+    "ALTER TABLE shopping_lists ADD COLUMN IF NOT EXISTS source_version VARCHAR(64)",
+    "ALTER TABLE shopping_lists ADD COLUMN IF NOT EXISTS version INTEGER NOT NULL DEFAULT 1",
+    "ALTER TABLE ingredients ADD COLUMN IF NOT EXISTS density FLOAT",
+    "ALTER TABLE ingredients ADD COLUMN IF NOT EXISTS piece_weight FLOAT",
+    "ALTER TABLE shopping_lists ADD COLUMN IF NOT EXISTS user_id INTEGER REFERENCES users(id) ON DELETE CASCADE",
+    "ALTER TABLE shopping_lists ADD COLUMN IF NOT EXISTS start_date TIMESTAMP",
+    "ALTER TABLE shopping_lists ADD COLUMN IF NOT EXISTS end_date TIMESTAMP",
+    "CREATE INDEX IF NOT EXISTS ix_shopping_lists_user_id ON shopping_lists (user_id)",
+    "CREATE INDEX IF NOT EXISTS ix_meal_plans_user_id ON meal_plans (user_id)",
+    "CREATE INDEX IF NOT EXISTS ix_meal_plan_entries_meal_plan_id_date ON meal_plan_entries (meal_plan_id, date)",
+    "CREATE INDEX IF NOT EXISTS ix_shopping_lists_created_at_id ON shopping_lists (created_at, id)",
+    "CREATE INDEX IF NOT EXISTS ix_shopping_lists_meal_plan_id ON shopping_lists (meal_plan_id)",
+    *recipe_search.POSTGRES_DDL,
+    # pg_trgm is a trusted extension (PostgreSQL 13+), so the database owner can create it
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    "CREATE INDEX IF NOT EXISTS ix_ingredients_name_trgm ON ingredients USING GIN (name gin_trgm_ops)",
+    "CREATE INDEX IF NOT EXISTS ix_recipes_name_trgm ON recipes USING GIN (name gin_trgm_ops)",
+    # dietary_tags was created as json, which has no containment operator or
+    # index support; convert once, then index for @> lookups
+    """
+    DO $$
+    BEGIN
+        IF EXISTS (
+            SELECT 1 FROM information_schema.columns
+            WHERE table_name = 'recipes' AND column_name = 'dietary_tags' AND data_type = 'json'
+        ) THEN
+            ALTER TABLE recipes ALTER COLUMN dietary_tags TYPE jsonb USING dietary_tags::jsonb;
+        END IF;
+    END
+    $$
+    """,
+    "CREATE INDEX IF NOT EXISTS ix_recipes_dietary_tags ON recipes USING GIN (dietary_tags jsonb_path_ops)",
+    # Covers /recipes/summary pages so they can be index-only scans
+    "CREATE INDEX IF NOT EXISTS ix_recipes_summary ON recipes (id) "
+    "INCLUDE (name, category, servings, prep_time, cook_time, calories, protein, carbs, fats)",
+    # Nutrition rolled up from ingredients; `upgrade` backfills rows left
+    # NULL, found through the partial index so an up-to-date table costs
+    # one empty index probe
+    "ALTER TABLE recipes ADD COLUMN IF NOT EXISTS computed_calories FLOAT",
+    "ALTER TABLE recipes ADD COLUMN IF NOT EXISTS computed_protein FLOAT",
+    "ALTER TABLE recipes ADD COLUMN IF NOT EXISTS computed_carbs FLOAT",
+    "ALTER TABLE recipes ADD COLUMN IF NOT EXISTS computed_fats FLOAT",
+    "CREATE INDEX IF NOT EXISTS ix_recipes_nutrition_pending ON recipes (id) WHERE computed_calories IS NULL",
+    # Matches models.EFFECTIVE_CALORIES, used by the min/max calorie filters
+    "CREATE INDEX IF NOT EXISTS ix_recipes_effective_calories ON recipes "
+    "((coalesce(nullif(calories, 0), computed_calories)))",
+    "CREATE INDEX IF NOT EXISTS ix_recipe_ingredients_ingredient_id ON recipe_ingredients (ingredient_id)",
+    "CREATE INDEX IF NOT EXISTS ix_shopping_list_items_ingredient_id ON shopping_list_items (ingredient_id)",
+    # Concurrent requests could store the same household list twice; keep the
+    # newest of each, which is the one GET /shopping-lists/household served
+    """
+    DELETE FROM shopping_lists older USING shopping_lists newer
+    WHERE older.user_id IS NOT NULL
+      AND newer.user_id = older.user_id
+      AND newer.start_date = older.start_date
+      AND newer.end_date = older.end_date
+      AND newer.source_version = older.source_version
+      AND newer.id > older.id
+    """,
+    "CREATE UNIQUE INDEX IF NOT EXISTS uq_shopping_lists_household "
+    "ON shopping_lists (user_id, start_date, end_date, source_version)",
+]
+
+
+def upgrade(engine: Engine) -> None:
+    if engine.dialect.name != 'postgresql':
+        return
+    with engine.begin() as conn:
+        for statement in POSTGRES_UPGRADES:
+            conn.execute(text(statement))
+    # Recipes stored before nutrition was materialized; every write path
+    # keeps it current after that
+    with Session(engine) as db:
+        backfill_nutrition(db)
@@ -1,6 +1,7 @@
 from datetime import datetime
 from typing import List
-from sqlalchemy import Column, Integer, String, Float, ForeignKey, DateTime, Table, JSON
+from sqlalchemy import Column, Integer, String, Float, ForeignKey, DateTime, Table, JSON, Index, func
+from sqlalchemy.dialects.postgresql import JSONB
 from sqlalchemy.orm import relationship, DeclarativeBase
 
 class Base(DeclarativeBase):
@@ -16,7 +17,7 @@ class Recipe(Base):
     cook_time = Column(Integer)  # in minutes
     instructions = Column(String, nullable=False)
     category = Column(String(100))
-    dietary_tags = Column(JSON)  # Array of dietary tags
+    dietary_tags = Column(JSON().with_variant(JSONB(), 'postgresql'))  # Array of dietary tags; JSONB + GIN index on PostgreSQL
     
     # Nutritional information
     calories = Column(Integer)
@@ -24,6 +25,12 @@ class Recipe(Base):
     carbs = Column(Float)
     fats = Column(Float)
     
+    # Per-serving nutrition rolled up from the ingredients (services/nutrition.py)
+    computed_calories = Column(Float)
+    computed_protein = Column(Float)
+    computed_carbs = Column(Float)
+    computed_fats = Column(Float)
+    
     # Meal type suitability weights (0-1)
     breakfast_weight = Column(Float, default=0.0)
     lunch_weight = Column(Float, default=0.0)
@@ -34,6 +41,11 @@ class Recipe(Base):
     ingredients = relationship('RecipeIngredient', back_populates='recipe')
     meal_plan_entries = relationship('MealPlanEntry', back_populates='recipe')
 
+# Entered calories, or the rolled-up ones where none (or 0) were entered, as
+# the catalog reads them; the calorie filters compare against this expression
+EFFECTIVE_CALORIES = func.coalesce(func.nullif(Recipe.calories, 0), Recipe.computed_calories)
+Index('ix_recipes_effective_calories', EFFECTIVE_CALORIES)
+
 class Ingredient(Base):
     __tablename__ = 'ingredients'
     
@@ -41,6 +53,8 @@ class Ingredient(Base):
     name = Column(String(255), nullable=False)
     category = Column(String(100))  # for shopping list organization
     base_unit = Column(String(50))  # base unit for nutritional info
+    density = Column(Float)  # g per ml, to convert between mass and volume
+    piece_weight = Column(Float)  # g per piece, to convert between mass and pieces
     
     # Nutritional information per base unit
     calories = Column(Float)
@@ -52,6 +66,10 @@ class Ingredient(Base):
 
 class RecipeIngredient(Base):
     __tablename__ = 'recipe_ingredients'
+    __table_args__ = (
+        # Finds the recipes to recompute when an ingredient's nutrition changes
+        Index('ix_recipe_ingredients_ingredient_id', 'ingredient_id'),
+    )
     
     recipe_id = Column(Integer, ForeignKey('recipes.id', ondelete="CASCADE"), primary_key=True)
     ingredient_id = Column(Integer, ForeignKey('ingredients.id', ondelete="CASCADE"), primary_key=True)
@@ -65,13 +83,14 @@ class MealPlan(Base):
     __tablename__ = 'meal_plans'
     
     id = Column(Integer, primary_key=True)
-    user_id = Column(Integer, ForeignKey('users.id', ondelete="CASCADE"))
+    user_id = Column(Integer, ForeignKey('users.id', ondelete="CASCADE"), index=True)
     start_date = Column(DateTime, nullable=False)
     end_date = Column(DateTime, nullable=False)
     people_count = Column(Integer, default=1)
     target_calories = Column(Integer)
     dietary_preferences = Column(JSON)  # Array of dietary preferences
     created_at = Column(DateTime, default=datetime.utcnow)
+    entries_hash = Column(String(64))  # content hash of the entries, see services.plan_hash
     
     entries = relationship('MealPlanEntry', back_populates='meal_plan')
     shopping_lists = relationship('ShoppingList', back_populates='meal_plan')
@@ -79,6 +98,10 @@ class MealPlan(Base):
 
 class MealPlanEntry(Base):
     __tablename__ = 'meal_plan_entries'
+    __table_args__ = (
+        # Entries of a plan, or of a user's plans, within a date range
+        Index('ix_meal_plan_entries_meal_plan_id_date', 'meal_plan_id', 'date'),
+    )
     
     id = Column(Integer, primary_key=True)
     meal_plan_id = Column(Integer, ForeignKey('meal_plans.id', ondelete="CASCADE"))
@@ -92,18 +115,35 @@ class MealPlanEntry(Base):
 
 class ShoppingList(Base):
     __tablename__ = 'shopping_lists'
+    __table_args__ = (
+        # Keyset pagination, newest first
+        Index('ix_shopping_lists_created_at_id', 'created_at', 'id'),
+        # One household list per user, date range and entries; plan lists
+        # have no user_id, and NULLs never collide
+        Index('uq_shopping_lists_household', 'user_id', 'start_date', 'end_date', 'source_version', unique=True),
+    )
     
     id = Column(Integer, primary_key=True)
-    meal_plan_id = Column(Integer, ForeignKey('meal_plans.id', ondelete="CASCADE"))
+    meal_plan_id = Column(Integer, ForeignKey('meal_plans.id', ondelete="CASCADE"), index=True)  # null for household lists
+    # Household lists span all of a user's plans between two dates
+    user_id = Column(Integer, ForeignKey('users.id', ondelete="CASCADE"), index=True)
+    start_date = Column(DateTime)
+    end_date = Column(DateTime)
     created_at = Column(DateTime, default=datetime.utcnow)
     status = Column(String(50), default='active')  # active, exported, completed
     export_format = Column(String(50))  # ios_reminders, pdf, etc.
+    source_version = Column(String(64))  # entries_hash of the entries the list reflects
+    version = Column(Integer, nullable=False, default=1, server_default='1')  # bumped whenever items change
     
     items = relationship('ShoppingListItem', back_populates='shopping_list')
     meal_plan = relationship('MealPlan', back_populates='shopping_lists')
 
 class ShoppingListItem(Base):
     __tablename__ = 'shopping_list_items'
+    __table_args__ = (
+        # Finds the lists to update when an ingredient is renamed or recategorized
+        Index('ix_shopping_list_items_ingredient_id', 'ingredient_id'),
+    )
     
     id = Column(Integer, primary_key=True)
     shopping_list_id = Column(Integer, ForeignKey('shopping_lists.id', ondelete="CASCADE"))
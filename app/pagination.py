@@ -0,0 +1,35 @@
+import base64
+import binascii
+import json
+from datetime import datetime
+from typing import Any, List, Tuple
+from fastapi import HTTPException
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+NEXT_CURSOR_HEADER = 'X-Next-Cursor'
+
+
+def encode_cursor(*values: Any) -> str:
+    """Opaque cursor for the sort key of the last row on a page."""
+    plain = [v.isoformat() if isinstance(v, datetime) else v for v in values]
+    return base64.urlsafe_b64encode(json.dumps(plain, separators=(',', ':')).encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor: str, *types: type) -> Tuple:
+    """Inverse of encode_cursor; `types` are the expected type of each value."""
+    try:
+        plain = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+        if not isinstance(plain, list) or len(plain) != len(types):
+            raise ValueError(cursor)
+        return tuple(
+            datetime.fromisoformat(value) if kind is datetime else kind(value)
+            for kind, value in zip(types, plain)
+        )
+    except (binascii.Error, ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+def split_page(rows: List, limit: int) -> Tuple[List, bool]:
+    """Rows fetched with limit + 1 -> (page, whether more rows follow)."""
+    return rows[:limit], len(rows) > limit
@@ -0,0 +1,42 @@
+from typing import Optional, Sequence, Type
+from sqlalchemy.orm import Session, joinedload, selectinload
+from . import models
+
+# Loader options per response schema. Each chain loads exactly what the
+# schema serializes: one-to-many hops are selectinloads (one IN query per
+# hop), many-to-one hops are joinedloads into the same query. A response is
+# then a fixed number of queries however many entries, recipes or items it has.
+
+# schemas.Recipe: recipe -> ingredients -> ingredient
+RECIPE_OPTIONS = (
+    selectinload(models.Recipe.ingredients).joinedload(models.RecipeIngredient.ingredient),
+)
+
+# schemas.MealPlanEntry: entry -> recipe -> ingredients -> ingredient
+MEAL_PLAN_ENTRY_OPTIONS = (
+    joinedload(models.MealPlanEntry.recipe)
+    .selectinload(models.Recipe.ingredients)
+    .joinedload(models.RecipeIngredient.ingredient),
+)
+
+# schemas.MealPlan: plan -> entries -> recipe -> ingredients -> ingredient
+MEAL_PLAN_OPTIONS = (
+    selectinload(models.MealPlan.entries)
+    .joinedload(models.MealPlanEntry.recipe)
+    .selectinload(models.Recipe.ingredients)
+    .joinedload(models.RecipeIngredient.ingredient),
+)
+
+# schemas.ShoppingList: list -> items -> ingredient
+SHOPPING_LIST_OPTIONS = (
+    selectinload(models.ShoppingList.items).joinedload(models.ShoppingListItem.ingredient),
+)
+
+
+def load_by_id(db: Session, model: Type, object_id: int, options: Sequence) -> Optional[object]:
+    """Reload one row with its response graph; replaces `db.refresh` before returning it.
+
+    populate_existing overwrites the instance already in the session, so
+    collections changed since it was loaded are read back as well.
+    """
+    return db.query(model).options(*options).populate_existing().filter(model.id == object_id).first()
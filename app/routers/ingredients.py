@@ -3,6 +3,9 @@ from sqlalchemy.orm import Session
 from typing import List, Optional
 from ..database import get_db
 from .. import models, schemas
+from ..services import (
+    fuzzy_name_filter, ingredient_autocomplete, recipe_catalog, refresh_ingredient_lists, refresh_ingredient_nutrition
+)
 from urllib.parse import unquote
 
 router = APIRouter(
@@ -15,13 +18,61 @@ async def list_ingredients(db: Session = Depends(get_db), name: Optional[str] =
     db_query = db.query(models.Ingredient)
     if name:
         name = unquote(name)
-        db_query = db_query.filter(models.Ingredient.name.ilike(f"%{name}%"))
+        db_query = fuzzy_name_filter(db_query, models.Ingredient.name, name)
     return db_query.all()
 
+@router.get("/autocomplete", response_model=List[schemas.IngredientSuggestion])
+async def autocomplete_ingredients(
+    q: str,
+    limit: int = Query(10, ge=1, le=50),
+    db: Session = Depends(get_db)
+):
+    """Typeahead from the in-process name index; the database is read only on first use."""
+    ingredient_autocomplete.ensure_loaded(db)
+    return [
+        schemas.IngredientSuggestion(id=ingredient_id, name=name)
+        for ingredient_id, name in ingredient_autocomplete.suggest(unquote(q), limit)
+    ]
+
 @router.post("/", response_model=schemas.Ingredient)
 async def create_ingredient(ingredient: schemas.IngredientCreate, db: Session = Depends(get_db)):
     db_ingredient = models.Ingredient(**ingredient.model_dump())
     db.add(db_ingredient)
     db.commit()
     db.refresh(db_ingredient)
+    ingredient_autocomplete.add(db_ingredient.id, db_ingredient.name)
+    return db_ingredient
+
+# Fields the recipe nutrition rollup reads
+NUTRITION_FIELDS = ('base_unit', 'density', 'piece_weight', 'calories', 'protein', 'carbs', 'fats')
+# Fields shopping lists show (and exports render)
+LISTING_FIELDS = ('name', 'category')
+
+@router.put("/{ingredient_id}", response_model=schemas.Ingredient)
+async def update_ingredient(ingredient_id: int, ingredient: schemas.IngredientCreate, db: Session = Depends(get_db)):
+    """Update an ingredient and what is derived from it.
+    
+    Recipes using it are recomputed if its nutrition or units changed;
+    shopping lists containing it get a new version if its name or category did.
+    """
+    db_ingredient = db.query(models.Ingredient).filter(models.Ingredient.id == ingredient_id).first()
+    if db_ingredient is None:
+        raise HTTPException(status_code=404, detail="Ingredient not found")
+    
+    values = ingredient.model_dump()
+    nutrition_changed = any(getattr(db_ingredient, field) != values[field] for field in NUTRITION_FIELDS)
+    listing_changed = any(getattr(db_ingredient, field) != values[field] for field in LISTING_FIELDS)
+    for key, value in values.items():
+        setattr(db_ingredient, key, value)
+    
+    if nutrition_changed:
+        db.flush()
+        refresh_ingredient_nutrition(db, ingredient_id)
+    if listing_changed:
+        refresh_ingredient_lists(db, ingredient_id, values['category'])
+    db.commit()
+    db.refresh(db_ingredient)
+    ingredient_autocomplete.add(db_ingredient.id, db_ingredient.name)
+    if nutrition_changed:
+        recipe_catalog.invalidate()
     return db_ingredient
\ No newline at end of file
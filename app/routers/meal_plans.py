@@ -1,12 +1,21 @@
-from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
+from fastapi.responses import StreamingResponse
+from starlette.background import BackgroundTask
 from sqlalchemy.orm import Session
-from typing import List, Optional
-from datetime import datetime, timedelta
-from ..database import get_db
+from typing import List, Literal, Optional
+from datetime import datetime
+from ..database import SessionLocal, get_db
 from .. import models, schemas
-from ..services import MealPlanGenerator
+from ..streaming import ClaimedStream
+from ..query_options import MEAL_PLAN_ENTRY_OPTIONS, MEAL_PLAN_OPTIONS, RECIPE_OPTIONS, load_by_id
+from ..services import (
+    CatalogSnapshot, MealPlanGenerator, PlanJobQueue, QueueFullError,
+    ingredient_totals, matching_records, recipe_catalog, refresh_entries_hash, update_shopping_lists
+)
+import itertools
+import json
 import random
-from .shopping_lists import generate_shopping_list
+from .shopping_lists import etag_matches, generate_shopping_list, load_shopping_list, shopping_list_etag
 
 
 def get_user(db: Session = Depends(get_db)):
@@ -19,6 +28,9 @@ def get_user(db: Session = Depends(get_db)):
         db.refresh(usr)
 
 
+# Background generation for long plans, see POST /auto-generate/jobs
+plan_jobs = PlanJobQueue(SessionLocal)
+
 router = APIRouter(
     prefix="/meal-plans",
     tags=["meal-plans"],
@@ -28,13 +40,13 @@ router = APIRouter(
 
 def test():
     for db in get_db():
-        recs = db.query(models.Recipe).all()
-        day = calculate_daily_meals(recs, 2000, [])
+        snapshot = recipe_catalog.snapshot(db)
+        day = calculate_daily_meals(snapshot, 2000, [])
     return day
 
-def calculate_daily_meals(recipes: List[models.Recipe], target_calories: int, dietary_preferences: List[str]):
-    # Filter recipes by dietary preferences
-    suitable_recipes = [r for r in recipes if all(pref in r.dietary_tags for pref in dietary_preferences) or not dietary_preferences]
+def calculate_daily_meals(snapshot: CatalogSnapshot, target_calories: int, dietary_preferences: List[str]):
+    # Filter recipes by dietary preferences using the catalog's tag bitmasks
+    suitable_recipes = matching_records(snapshot, dietary_preferences)
     
     if not suitable_recipes:
         return {}
@@ -65,8 +77,6 @@ def calculate_daily_meals(recipes: List[models.Recipe], target_calories: int, di
         # Extract weights for the specific meal type
         weights = [getattr(recipe, meal_weights_attr) for recipe in suitable_cal_recipes]
         
-        print([x.name for x in suitable_cal_recipes])
-        print(weights)
         # Handle case where all weights are 0
         if all(w == 0 for w in weights):
             return random.choice(suitable_cal_recipes)
@@ -97,7 +107,7 @@ def calculate_daily_meals(recipes: List[models.Recipe], target_calories: int, di
 
 @router.get("/", response_model=List[schemas.MealPlan])
 async def list_meal_plans(user_id: int, db: Session = Depends(get_db)):
-    return db.query(models.MealPlan).filter(models.MealPlan.user_id == user_id).all()
+    return db.query(models.MealPlan).options(*MEAL_PLAN_OPTIONS).filter(models.MealPlan.user_id == user_id).all()
 
 @router.post("/", response_model=schemas.MealPlan)
 async def create_meal_plan(meal_plan: schemas.MealPlanCreate, db: Session = Depends(get_db)):
@@ -121,28 +131,146 @@ async def create_meal_plan(meal_plan: schemas.MealPlanCreate, db: Session = Depe
         )
         db.add(db_entry)
     
+    db.flush()
+    refresh_entries_hash(db, db_meal_plan.id)
     db.commit()
-    db.refresh(db_meal_plan)
-    return db_meal_plan
+    return load_by_id(db, models.MealPlan, db_meal_plan.id, MEAL_PLAN_OPTIONS)
 
 @router.post("/auto-generate", response_model=schemas.MealPlan)
-async def auto_generate_meal_plan(
+def auto_generate_meal_plan(
     start_date: datetime,
     days: int,
     target_calories: int,
     people_count: int,
     dietary_preferences: List[str] = Query([]),
     user_id: int = Query(...),
+    engine: Literal['python', 'numpy'] = 'python',
+    seed: Optional[int] = None,
     db: Session = Depends(get_db)
 ):
-    # Get all available recipes
-    recipes = db.query(models.Recipe).all()
-    if not recipes:
+    # Check the shared recipe catalog instead of loading the table
+    if not recipe_catalog.snapshot(db).records:
         raise HTTPException(status_code=400, detail="No recipes available for meal planning")
     
     # Create meal plan
-    planner = MealPlanGenerator(db)
-    db_meal_plan = planner.generate_meal_plan(
+    planner = MealPlanGenerator(db, engine=engine, seed=seed)
+    try:
+        # Persisted in one transaction; the response is built from memory
+        meal_plan = planner.generate_meal_plan(
+            start_date=start_date,
+            days=days,
+            target_calories=target_calories,
+            people_count=people_count,
+            dietary_preferences=dietary_preferences,
+            user_id=user_id
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    return meal_plan
+
+@router.post("/auto-generate/jobs", response_model=schemas.MealPlanJob, status_code=202)
+def queue_meal_plan_generation(
+    start_date: datetime,
+    days: int,
+    target_calories: int,
+    people_count: int,
+    dietary_preferences: List[str] = Query([]),
+    user_id: int = Query(...),
+    engine: Literal['python', 'numpy'] = 'python',
+    seed: Optional[int] = None,
+    db: Session = Depends(get_db)
+):
+    if not recipe_catalog.snapshot(db).records:
+        raise HTTPException(status_code=400, detail="No recipes available for meal planning")
+
+    try:
+        return plan_jobs.submit(
+            start_date=start_date,
+            days=days,
+            target_calories=target_calories,
+            people_count=people_count,
+            dietary_preferences=dietary_preferences,
+            user_id=user_id,
+            engine=engine,
+            seed=seed
+        )
+    except QueueFullError as e:
+        raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": "5"})
+
+def _close_stream(events, db: Session) -> None:
+    # Closing a generator that stopped early discards its partial plan
+    try:
+        events.close()
+    finally:
+        db.close()
+
+def _ndjson_plan_lines(db: Session, first, events, include_recipes: bool):
+    # Each recipe is sent once, the first time a day references it
+    sent_recipes = set()
+    for kind, payload in itertools.chain([first], events):
+        if kind == 'meal_plan':
+            yield json.dumps({
+                "type": "meal_plan",
+                "id": payload.id,
+                "user_id": payload.user_id,
+                "start_date": payload.start_date.isoformat(),
+                "end_date": payload.end_date.isoformat(),
+                "people_count": payload.people_count,
+                "target_calories": payload.target_calories,
+                "dietary_preferences": payload.dietary_preferences,
+                "created_at": payload.created_at.isoformat(),
+            }) + "\n"
+        elif kind == 'day':
+            date, meals = payload
+            new_ids = {recipe.id for recipe in meals.values()} - sent_recipes
+            if include_recipes and new_ids:
+                recipes = db.query(models.Recipe).options(*RECIPE_OPTIONS).filter(models.Recipe.id.in_(new_ids)).all()
+                for recipe in recipes:
+                    yield json.dumps({
+                        "type": "recipe",
+                        "recipe": schemas.Recipe.model_validate(recipe).model_dump(mode='json'),
+                    }) + "\n"
+                # Keep the session's identity map from growing with the plan
+                for recipe in recipes:
+                    db.expunge(recipe)
+                sent_recipes |= new_ids
+            yield json.dumps({
+                "type": "day",
+                "date": date.isoformat(),
+                "meals": {meal_type: recipe.id for meal_type, recipe in meals.items()},
+            }) + "\n"
+        elif kind == 'error':
+            yield json.dumps({"type": "error", "detail": payload}) + "\n"
+            return
+    yield json.dumps({"type": "end"}) + "\n"
+
+@router.post("/auto-generate/stream")
+def stream_meal_plan_generation(
+    start_date: datetime,
+    days: int,
+    target_calories: int,
+    people_count: int,
+    dietary_preferences: List[str] = Query([]),
+    user_id: int = Query(...),
+    engine: Literal['python', 'numpy'] = 'python',
+    seed: Optional[int] = None,
+    include_recipes: bool = False,
+    db: Session = Depends(get_db)
+):
+    """Generate a plan as NDJSON: a meal_plan line, then one day line per day.
+
+    Days reference recipes by id; with include_recipes, a recipe line is
+    sent before the first day that uses it. Entries are persisted in
+    batches while the stream runs.
+    """
+    if not recipe_catalog.snapshot(db).records:
+        raise HTTPException(status_code=400, detail="No recipes available for meal planning")
+
+    # The stream outlives this request's session, so it gets its own
+    stream_db = SessionLocal()
+    planner = MealPlanGenerator(stream_db, engine=engine, seed=seed)
+    events = planner.stream_meal_plan(
         start_date=start_date,
         days=days,
         target_calories=target_calories,
@@ -150,42 +278,46 @@ async def auto_generate_meal_plan(
         dietary_preferences=dietary_preferences,
         user_id=user_id
     )
-    # db_meal_plan = models.MealPlan(
-    #     user_id=user_id,
-    #     start_date=start_date,
-    #     end_date=start_date + timedelta(days=days),
-    #     people_count=people_count,
-    #     target_calories=target_calories,
-    #     dietary_preferences=dietary_preferences
-    # )
-    # db.add(db_meal_plan)
-    # db.commit()
-    # db.refresh(db_meal_plan)
-    
-    # # Generate meals for each day
-    # current_date = start_date
-    # for _ in range(days):
-    #     daily_meals = calculate_daily_meals(recipes, target_calories, dietary_preferences)
-        
-    #     for meal_type, recipe in daily_meals.items():
-    #         db_entry = models.MealPlanEntry(
-    #             meal_plan_id=db_meal_plan.id,
-    #             recipe_id=recipe.id,
-    #             date=current_date,
-    #             meal_type=meal_type,
-    #             servings=people_count
-    #         )
-    #         db.add(db_entry)
-        
-        # current_date += timedelta(days=1)
-    
-    db.commit()
-    db.refresh(db_meal_plan)
-    return db_meal_plan
+    try:
+        first = next(events)
+    except ValueError as e:
+        stream_db.close()
+        raise HTTPException(status_code=400, detail=str(e))
+
+    stream = ClaimedStream(
+        lambda: _ndjson_plan_lines(stream_db, first, events, include_recipes),
+        lambda: _close_stream(events, stream_db)
+    )
+    return StreamingResponse(
+        stream.body(),
+        media_type="application/x-ndjson",
+        background=BackgroundTask(stream.close_unstarted)
+    )
+
+@router.get("/jobs/{job_id}", response_model=schemas.MealPlanJob)
+async def get_meal_plan_job(job_id: str):
+    job = plan_jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+@router.get("/jobs/{job_id}/result", response_model=schemas.MealPlan)
+async def get_meal_plan_job_result(job_id: str, db: Session = Depends(get_db)):
+    job = plan_jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    if job.status == 'failed':
+        raise HTTPException(status_code=400, detail=job.error)
+    if job.status != 'completed':
+        raise HTTPException(status_code=409, detail=f"Job is {job.status}")
+    meal_plan = load_by_id(db, models.MealPlan, job.meal_plan_id, MEAL_PLAN_OPTIONS)
+    if meal_plan is None:
+        raise HTTPException(status_code=404, detail="Meal plan not found")
+    return meal_plan
 
 @router.get("/{meal_plan_id}", response_model=schemas.MealPlan)
 async def get_meal_plan(meal_plan_id: int, db: Session = Depends(get_db)):
-    meal_plan = db.query(models.MealPlan).filter(models.MealPlan.id == meal_plan_id).first()
+    meal_plan = load_by_id(db, models.MealPlan, meal_plan_id, MEAL_PLAN_OPTIONS)
     if meal_plan is None:
         raise HTTPException(status_code=404, detail="Meal plan not found")
     return meal_plan
@@ -196,12 +328,15 @@ async def update_meal_plan(meal_plan_id: int, meal_plan: schemas.MealPlanCreate,
     if db_meal_plan is None:
         raise HTTPException(status_code=404, detail="Meal plan not found")
     
+    in_plan = models.MealPlanEntry.meal_plan_id == meal_plan_id
+    before = ingredient_totals(db, in_plan)
+    
     # Update meal plan attributes
     for key, value in meal_plan.model_dump(exclude={'entries'}).items():
         setattr(db_meal_plan, key, value)
     
     # Update entries
-    db.query(models.MealPlanEntry).filter(models.MealPlanEntry.meal_plan_id == meal_plan_id).delete()
+    db.query(models.MealPlanEntry).filter(in_plan).delete()
     
     for entry in meal_plan.entries:
         db_entry = models.MealPlanEntry(
@@ -210,9 +345,11 @@ async def update_meal_plan(meal_plan_id: int, meal_plan: schemas.MealPlanCreate,
         )
         db.add(db_entry)
     
+    # Patch the plan's shopping lists with what changed instead of regenerating them
+    db.flush()
+    update_shopping_lists(db, db_meal_plan, before, in_plan)
     db.commit()
-    db.refresh(db_meal_plan)
-    return db_meal_plan
+    return load_by_id(db, models.MealPlan, meal_plan_id, MEAL_PLAN_OPTIONS)
 
 @router.delete("/{meal_plan_id}")
 async def delete_meal_plan(meal_plan_id: int, db: Session = Depends(get_db)):
@@ -234,18 +371,48 @@ async def update_meal(meal_plan_id: int, meal_id: int, meal: schemas.MealPlanEnt
     if db_meal is None:
         raise HTTPException(status_code=404, detail="Meal not found")
     
+    this_meal = models.MealPlanEntry.id == meal_id
+    before = ingredient_totals(db, this_meal)
+    
     for key, value in meal.model_dump().items():
         setattr(db_meal, key, value)
     
+    db.flush()
+    update_shopping_lists(db, db_meal.meal_plan, before, this_meal)
     db.commit()
-    db.refresh(db_meal)
-    return db_meal
+    return load_by_id(db, models.MealPlanEntry, meal_id, MEAL_PLAN_ENTRY_OPTIONS)
 
 # Add this endpoint to the meal_plans router
+def current_shopping_list(meal_plan: models.MealPlan, db: Session):
+    """(id, version) of the newest list generated from the plan's current entries."""
+    return db.query(models.ShoppingList.id, models.ShoppingList.version).filter(
+        models.ShoppingList.meal_plan_id == meal_plan.id,
+        models.ShoppingList.source_version == meal_plan.entries_hash
+    ).order_by(models.ShoppingList.id.desc()).first()
+
 @router.get("/{meal_plan_id}/shopping-list", response_model=schemas.ShoppingList)
-async def create_shopping_list(meal_plan_id: int, db: Session = Depends(get_db)):
+async def create_shopping_list(meal_plan_id: int, request: Request, response: Response, db: Session = Depends(get_db)):
     meal_plan = db.query(models.MealPlan).filter(models.MealPlan.id == meal_plan_id).first()
     if not meal_plan:
         raise HTTPException(status_code=404, detail="Meal plan not found")
     
-    return generate_shopping_list(meal_plan, db)
\ No newline at end of file
+    if meal_plan.entries_hash is None:
+        # Plans written before entries were hashed
+        refresh_entries_hash(db, meal_plan_id)
+        db.commit()
+    
+    shopping_list = None
+    current = current_shopping_list(meal_plan, db)
+    if current is None:
+        # Lock the plan so concurrent polls don't both generate a list
+        meal_plan = db.query(models.MealPlan).filter(models.MealPlan.id == meal_plan_id).with_for_update().first()
+        current = current_shopping_list(meal_plan, db)
+        if current is None:
+            shopping_list = generate_shopping_list(meal_plan, db)
+            current = (shopping_list.id, shopping_list.version)
+    
+    etag = shopping_list_etag(*current)
+    if etag_matches(request.headers.get('if-none-match'), etag):
+        return Response(status_code=304, headers={'ETag': etag})
+    response.headers['ETag'] = etag
+    return shopping_list or load_shopping_list(current[0], db)
\ No newline at end of file
@@ -1,9 +1,18 @@
-from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
+from starlette.background import BackgroundTask
 from sqlalchemy.orm import Session
-from sqlalchemy import or_
-from typing import List, Optional
-from ..database import get_db
+from typing import List, Literal, Optional
+from ..database import SessionLocal, get_db
 from .. import models, schemas
+from ..query_options import RECIPE_OPTIONS, load_by_id
+from ..streaming import ClaimedStream
+from ..pagination import NEXT_CURSOR_HEADER, decode_cursor, encode_cursor, split_page
+from ..services import (
+    NutrientIndex, filter_by_tags, fuzzy_name_filter, recipe_catalog, recipe_search, recipe_transfer,
+    refresh_recipe_nutrition
+)
 import json
 from datetime import datetime
 
@@ -12,10 +21,63 @@ router = APIRouter(
     tags=["recipes"]
 )
 
+# Columns of schemas.RecipeSummary, all covered by ix_recipes_summary on PostgreSQL
+SUMMARY_COLUMNS = (
+    models.Recipe.id,
+    models.Recipe.name,
+    models.Recipe.category,
+    models.Recipe.servings,
+    models.Recipe.prep_time,
+    models.Recipe.cook_time,
+    models.Recipe.calories,
+    models.Recipe.protein,
+    models.Recipe.carbs,
+    models.Recipe.fats,
+)
+
+def filter_recipes(
+    query,
+    category: Optional[str],
+    name: Optional[str],
+    dietary_tags: Optional[List[str]],
+    max_prep_time: Optional[int],
+    min_calories: Optional[int],
+    max_calories: Optional[int]
+):
+    """Apply the listing filters; None when no recipe can match."""
+    if name:
+        # Pages are ordered by id, so skip the similarity ranking
+        query = fuzzy_name_filter(query, models.Recipe.name, name, ranked=False)
+    if category:
+        query = query.filter(models.Recipe.category == category)
+    if dietary_tags:
+        query = filter_by_tags(query, dietary_tags)
+        if query is None:
+            return None
+    if max_prep_time:
+        query = query.filter(models.Recipe.prep_time <= max_prep_time)
+    if min_calories:
+        query = query.filter(models.EFFECTIVE_CALORIES >= min_calories)
+    if max_calories:
+        query = query.filter(models.EFFECTIVE_CALORIES <= max_calories)
+    return query
+
+def page_by_id(query, response: Response, cursor: Optional[str], skip: int, limit: int) -> list:
+    """One page ordered by id; X-Next-Cursor is set when more rows follow."""
+    if cursor:
+        query = query.filter(models.Recipe.id > decode_cursor(cursor, int)[0])
+    rows = query.order_by(models.Recipe.id).offset(skip).limit(limit + 1).all()
+    page, more = split_page(rows, limit)
+    if more:
+        response.headers[NEXT_CURSOR_HEADER] = encode_cursor(page[-1].id)
+    return page
+
 @router.get("/", response_model=List[schemas.Recipe])
 async def list_recipes(
+    response: Response,
     skip: int = 0,
-    limit: int = 100,
+    limit: int = Query(100, ge=1),
+    cursor: Optional[str] = None,
     category: Optional[str] = None,
     name: Optional[str] = None,
     dietary_tags: Optional[List[str]] = Query(None),
@@ -24,22 +86,35 @@ async def list_recipes(
     max_calories: Optional[int] = None,
     db: Session = Depends(get_db)
 ):
-    query = db.query(models.Recipe)
-    
-    if name:
-        query = query.filter(models.Recipe.name.ilike(f"%{name}%"))
-    if category:
-        query = query.filter(models.Recipe.category == category)
-    if dietary_tags:
-        query = query.filter(models.Recipe.dietary_tags.contains(dietary_tags))
-    if max_prep_time:
-        query = query.filter(models.Recipe.prep_time <= max_prep_time)
-    if min_calories:
-        query = query.filter(models.Recipe.calories >= min_calories)
-    if max_calories:
-        query = query.filter(models.Recipe.calories <= max_calories)
-    
-    return query.offset(skip).limit(limit).all()
+    """Recipes by id. Page with `cursor` (from X-Next-Cursor) rather than `skip`."""
+    query = filter_recipes(
+        db.query(models.Recipe).options(*RECIPE_OPTIONS),
+        category, name, dietary_tags, max_prep_time, min_calories, max_calories
+    )
+    if query is None:
+        return []
+    return page_by_id(query, response, cursor, skip, limit)
+
+@router.get("/summary", response_model=List[schemas.RecipeSummary])
+async def list_recipe_summaries(
+    response: Response,
+    limit: int = Query(100, ge=1),
+    cursor: Optional[str] = None,
+    category: Optional[str] = None,
+    name: Optional[str] = None,
+    dietary_tags: Optional[List[str]] = Query(None),
+    max_prep_time: Optional[int] = None,
+    min_calories: Optional[int] = None,
+    max_calories: Optional[int] = None,
+    db: Session = Depends(get_db)
+):
+    """Same filters and paging as the list, with only the columns needed for browsing."""
+    query = filter_recipes(
+        db.query(*SUMMARY_COLUMNS), category, name, dietary_tags, max_prep_time, min_calories, max_calories
+    )
+    if query is None:
+        return []
+    return page_by_id(query, response, cursor, 0, limit)
 
 @router.post("/", response_model=schemas.Recipe)
 async def create_recipe(recipe: schemas.RecipeCreate, db: Session = Depends(get_db)):
@@ -71,17 +146,92 @@ async def create_recipe(recipe: schemas.RecipeCreate, db: Session = Depends(get_
         )
         db.add(db_recipe_ingredient)
     
+    db.flush()
+    refresh_recipe_nutrition(db, [db_recipe.id])
     db.commit()
-    db.refresh(db_recipe)
-    return db_recipe
+    recipe_catalog.invalidate()
+    return load_by_id(db, models.Recipe, db_recipe.id, RECIPE_OPTIONS)
+
+def _export_stream(db: Session, format: str, compress: bool):
+    documents = recipe_transfer.export_documents(db)
+    return recipe_transfer.encode_chunks(recipe_transfer.frame_documents(documents, format), compress)
+
+@router.get("/export")
+def export_recipes(format: Literal['json', 'ndjson'] = 'json', compress: bool = False):
+    """Every recipe, streamed as a JSON array or as NDJSON (one recipe per line).
+
+    Recipes are read in batches through a server-side cursor, so memory
+    does not grow with the catalog. With `compress` the body is
+    gzip-encoded. The NDJSON form is what POST /recipes/import takes.
+    """
+    headers = {"Content-Disposition": f'attachment; filename="recipes.{format}"'}
+    if compress:
+        headers["Content-Encoding"] = "gzip"
+    media_type = "application/x-ndjson" if format == 'ndjson' else "application/json"
+    # The stream outlives this request, so it gets its own session, closed
+    # by the body or, if the body never runs, by the background task
+    db = SessionLocal()
+    stream = ClaimedStream(lambda: _export_stream(db, format, compress), db.close)
+    return StreamingResponse(
+        stream.body(), media_type=media_type, headers=headers, background=BackgroundTask(stream.close_unstarted)
+    )
+
+@router.get("/search", response_model=List[schemas.Recipe])
+async def search_recipes(
+    query: str,
+    category: Optional[str] = None,
+    dietary_tags: Optional[List[str]] = Query(None),
+    max_prep_time: Optional[int] = None,
+    min_calories: Optional[int] = None,
+    max_calories: Optional[int] = None,
+    db: Session = Depends(get_db)
+):
+    # Ranked full-text search on PostgreSQL, ILIKE elsewhere
+    db_query = recipe_search.search(db.query(models.Recipe).options(*RECIPE_OPTIONS), query)
+    
+    if category:
+        db_query = db_query.filter(models.Recipe.category == category)
+    if dietary_tags:
+        db_query = filter_by_tags(db_query, dietary_tags)
+        if db_query is None:
+            return []
+    if max_prep_time:
+        db_query = db_query.filter(models.Recipe.prep_time <= max_prep_time)
+    if min_calories:
+        db_query = db_query.filter(models.EFFECTIVE_CALORIES >= min_calories)
+    if max_calories:
+        db_query = db_query.filter(models.EFFECTIVE_CALORIES <= max_calories)
+    
+    return db_query.all()
 
 @router.get("/{recipe_id}", response_model=schemas.Recipe)
 async def get_recipe(recipe_id: int, db: Session = Depends(get_db)):
-    recipe = db.query(models.Recipe).filter(models.Recipe.id == recipe_id).first()
+    recipe = load_by_id(db, models.Recipe, recipe_id, RECIPE_OPTIONS)
     if recipe is None:
         raise HTTPException(status_code=404, detail="Recipe not found")
     return recipe
 
+@router.get("/{recipe_id}/substitutes", response_model=List[schemas.Recipe])
+async def get_recipe_substitutes(
+    recipe_id: int,
+    k: int = Query(5, ge=1, le=50),
+    meal_type: Optional[Literal['breakfast', 'lunch', 'dinner']] = None,
+    db: Session = Depends(get_db)
+):
+    """The k recipes closest in calories, protein, carbs and fats."""
+    snapshot = recipe_catalog.snapshot(db)
+    recipe = snapshot.by_id.get(recipe_id)
+    if recipe is None:
+        raise HTTPException(status_code=404, detail="Recipe not found")
+
+    index = NutrientIndex.for_snapshot(snapshot, meal_type=meal_type)
+    point = index.query_point(recipe.calories, recipe.protein, recipe.carbs, recipe.fats)
+    closest = index.nearest(point, k, is_allowed=lambda r: r.id != recipe_id)
+
+    ids = [r.id for r in closest]
+    recipes = {r.id: r for r in db.query(models.Recipe).options(*RECIPE_OPTIONS).filter(models.Recipe.id.in_(ids)).all()}
+    return [recipes[i] for i in ids if i in recipes]
+
 @router.put("/{recipe_id}", response_model=schemas.Recipe)
 async def update_recipe(recipe_id: int, recipe: schemas.RecipeCreate, db: Session = Depends(get_db)):
     db_recipe = db.query(models.Recipe).filter(models.Recipe.id == recipe_id).first()
@@ -102,9 +252,11 @@ async def update_recipe(recipe_id: int, recipe: schemas.RecipeCreate, db: Sessio
         )
         db.add(db_recipe_ingredient)
     
+    db.flush()
+    refresh_recipe_nutrition(db, [recipe_id])
     db.commit()
-    db.refresh(db_recipe)
-    return db_recipe
+    recipe_catalog.invalidate()
+    return load_by_id(db, models.Recipe, recipe_id, RECIPE_OPTIONS)
 
 @router.delete("/{recipe_id}")
 async def delete_recipe(recipe_id: int, db: Session = Depends(get_db)):
@@ -115,62 +267,45 @@ async def delete_recipe(recipe_id: int, db: Session = Depends(get_db)):
     # Delete associated recipe ingredients (cascade will handle this if set up in models)
     db.delete(db_recipe)
     db.commit()
+    recipe_catalog.invalidate()
     return {"message": "Recipe deleted successfully"}
 
 @router.post("/bulk-import", response_model=List[schemas.Recipe])
-async def bulk_import_recipes(recipes: List[schemas.RecipeCreate], db: Session = Depends(get_db)):
-    imported_recipes = []
-    for recipe_data in recipes:
-        db_recipe = models.Recipe(**recipe_data.model_dump(exclude={'ingredients'}))
-        db.add(db_recipe)
-        db.commit()
-        db.refresh(db_recipe)
-        
-        for ingredient_data in recipe_data.ingredients:
-            db_recipe_ingredient = models.RecipeIngredient(
-                recipe_id=db_recipe.id,
-                **ingredient_data.model_dump()
-            )
-            db.add(db_recipe_ingredient)
-        
-        imported_recipes.append(db_recipe)
-    
-    db.commit()
-    return imported_recipes
+def bulk_import_recipes(recipes: List[schemas.RecipeImport], db: Session = Depends(get_db)):
+    """Import a JSON array in one transaction; stream large catalogs to /recipes/import instead."""
+    importer = recipe_transfer.RecipeImporter(db)
+    try:
+        imported_ids = importer.write(list(enumerate(recipes, start=1)))
+    except recipe_transfer.RecipeImportError as e:
+        raise HTTPException(status_code=400, detail=f"Recipe {e.line}: {e.detail}")
+    recipe_catalog.invalidate()
+    return db.query(models.Recipe).options(*RECIPE_OPTIONS).filter(
+        models.Recipe.id.in_(imported_ids)
+    ).order_by(models.Recipe.id).all()
 
-@router.get("/export", response_model=List[schemas.Recipe])
-async def export_recipes(db: Session = Depends(get_db)):
-    recipes = db.query(models.Recipe).all()
-    return recipes
+@router.post("/import", response_model=schemas.RecipeImportResult)
+async def import_recipes(request: Request, db: Session = Depends(get_db)):
+    """Import NDJSON recipes, as written by GET /recipes/export?format=ndjson.
 
-@router.get("/search", response_model=List[schemas.Recipe])
-async def search_recipes(
-    query: str,
-    category: Optional[str] = None,
-    dietary_tags: Optional[List[str]] = Query(None),
-    max_prep_time: Optional[int] = None,
-    min_calories: Optional[int] = None,
-    max_calories: Optional[int] = None,
-    db: Session = Depends(get_db)
-):
-    search = f"%{query}%"
-    db_query = db.query(models.Recipe).filter(
-        or_(
-            models.Recipe.name.ilike(search),
-            models.Recipe.instructions.ilike(search),
-            models.Recipe.category.ilike(search)
+    The body may be gzipped. It is parsed as it arrives and written in
+    chunked transactions; ingredients given by value are matched by name or
+    created. A bad line fails the request, but chunks committed before it
+    stay imported. Chunks are written in a worker thread, so the event loop
+    keeps serving other requests meanwhile.
+    """
+    importer = recipe_transfer.RecipeImporter(db)
+    gzipped = request.headers.get("content-encoding", "").lower() == "gzip"
+    try:
+        async for number, line in recipe_transfer.ndjson_lines(request.stream(), gzipped):
+            if importer.add(number, recipe_transfer.parse_recipe(number, line)):
+                await run_in_threadpool(importer.flush)
+        await run_in_threadpool(importer.flush)
+    except recipe_transfer.RecipeImportError as e:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Line {e.line}: {e.detail} ({importer.imported} recipes imported before it)"
         )
-    )
-    
-    if category:
-        db_query = db_query.filter(models.Recipe.category == category)
-    if dietary_tags:
-        db_query = db_query.filter(models.Recipe.dietary_tags.contains(dietary_tags))
-    if max_prep_time:
-        db_query = db_query.filter(models.Recipe.prep_time <= max_prep_time)
-    if min_calories:
-        db_query = db_query.filter(models.Recipe.calories >= min_calories)
-    if max_calories:
-        db_query = db_query.filter(models.Recipe.calories <= max_calories)
-    
-    return db_query.all()
\ No newline at end of file
+    finally:
+        if importer.imported:
+            recipe_catalog.invalidate()
+    return schemas.RecipeImportResult(imported=importer.imported, created_ingredients=importer.created_ingredients)
\ No newline at end of file
@@ -1,59 +1,208 @@
-from fastapi import APIRouter, Depends, HTTPException, Query
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
+from fastapi.responses import StreamingResponse
+from sqlalchemy import case, func, insert, or_, select, tuple_, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session, joinedload
 from typing import List, Optional
 from datetime import datetime
 from ..database import get_db
 from .. import models, schemas
-from collections import defaultdict
+from ..query_options import SHOPPING_LIST_OPTIONS
+from ..pagination import DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE, NEXT_CURSOR_HEADER, decode_cursor, encode_cursor, split_page
+from ..services import (
+    EXPORTERS, ExportItem, export_cache, household_entries, ingredient_totals, naive_utc, query_entries_hash
+)
 
 router = APIRouter(
     prefix="/shopping-lists",
     tags=["shopping-lists"]
 )
 
-def generate_shopping_list(meal_plan: models.MealPlan, db: Session):
-    ingredients_needed = defaultdict(float)
-    
-    for entry in meal_plan.entries:
-        recipe = db.query(models.Recipe).get(entry.recipe_id)
-        if not recipe:
-            continue
-            
-        multiplier = entry.servings / recipe.servings
-        for recipe_ingredient in recipe.ingredients:
-            key = (recipe_ingredient.ingredient_id, recipe_ingredient.unit)
-            ingredients_needed[key] += recipe_ingredient.quantity * multiplier
-    
+def shopping_list_etag(shopping_list_id: int, version: int) -> str:
+    return f'"{shopping_list_id}-{version}"'
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    candidates = [tag.strip() for tag in if_none_match.split(',')]
+    # Weak comparison: W/"x" matches "x"
+    return '*' in candidates or etag in (tag[2:] if tag.startswith('W/') else tag for tag in candidates)
+
+def load_shopping_list(shopping_list_id: int, db: Session) -> Optional[models.ShoppingList]:
+    return db.query(models.ShoppingList).options(*SHOPPING_LIST_OPTIONS).filter(models.ShoppingList.id == shopping_list_id).first()
+
+def store_shopping_list(db: Session, totals, **fields):
+    """Insert a list with one item per consolidated total, commit and reload it."""
     shopping_list = models.ShoppingList(
-        meal_plan_id=meal_plan.id,
         created_at=datetime.utcnow(),
-        status='active'
+        status='active',
+        **fields
     )
     db.add(shopping_list)
-    db.commit()
+    db.flush()
     
-    for (ingredient_id, unit), quantity in ingredients_needed.items():
-        ingredient = db.query(models.Ingredient).get(ingredient_id)
-        item = models.ShoppingListItem(
-            shopping_list_id=shopping_list.id,
-            ingredient_id=ingredient_id,
-            quantity=quantity,
-            unit=unit,
-            category=ingredient.category
-        )
-        db.add(item)
+    if totals:
+        db.execute(insert(models.ShoppingListItem), [
+            {
+                'shopping_list_id': shopping_list.id,
+                'ingredient_id': row.ingredient_id,
+                'quantity': row.quantity,
+                'unit': row.unit,
+                'category': row.category,
+            }
+            for row in totals
+        ])
     
+    shopping_list_id = shopping_list.id
     db.commit()
-    db.refresh(shopping_list)
-    return shopping_list
+    return load_shopping_list(shopping_list_id, db)
+
+def generate_shopping_list(meal_plan: models.MealPlan, db: Session):
+    # Quantities are consolidated per (ingredient, unit) by the database
+    totals = ingredient_totals(db, models.MealPlanEntry.meal_plan_id == meal_plan.id)
+    return store_shopping_list(db, totals, meal_plan_id=meal_plan.id, source_version=meal_plan.entries_hash)
+
+def list_filters(meal_plan_id: Optional[int], status: Optional[str], cursor: Optional[str]) -> list:
+    criteria = []
+    if meal_plan_id is not None:
+        criteria.append(models.ShoppingList.meal_plan_id == meal_plan_id)
+    if status is not None:
+        criteria.append(models.ShoppingList.status == status)
+    if cursor:
+        # Newest first: continue strictly after the last (created_at, id) seen
+        created_at, shopping_list_id = decode_cursor(cursor, datetime, int)
+        criteria.append(
+            tuple_(models.ShoppingList.created_at, models.ShoppingList.id) < tuple_(created_at, shopping_list_id)
+        )
+    return criteria
+
+def set_next_cursor(response: Response, page: list, more: bool) -> None:
+    if more:
+        response.headers[NEXT_CURSOR_HEADER] = encode_cursor(page[-1].created_at, page[-1].id)
 
 @router.get("/", response_model=List[schemas.ShoppingList])
-async def list_shopping_lists(db: Session = Depends(get_db)):
-    return db.query(models.ShoppingList).all()
+async def list_shopping_lists(
+    response: Response,
+    meal_plan_id: Optional[int] = None,
+    status: Optional[str] = None,
+    cursor: Optional[str] = None,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    db: Session = Depends(get_db)
+):
+    """Newest lists first; pass the X-Next-Cursor header back as `cursor` for the next page."""
+    rows = db.query(models.ShoppingList).options(*SHOPPING_LIST_OPTIONS).filter(*list_filters(meal_plan_id, status, cursor)).order_by(
+        models.ShoppingList.created_at.desc(), models.ShoppingList.id.desc()
+    ).limit(limit + 1).all()
+    page, more = split_page(rows, limit)
+    set_next_cursor(response, page, more)
+    return page
+
+@router.get("/summary", response_model=List[schemas.ShoppingListSummary])
+async def list_shopping_list_summaries(
+    response: Response,
+    meal_plan_id: Optional[int] = None,
+    status: Optional[str] = None,
+    cursor: Optional[str] = None,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    db: Session = Depends(get_db)
+):
+    """Like the list endpoint, but with item counts per category instead of items."""
+    page_lists = select(
+        models.ShoppingList.id,
+        models.ShoppingList.meal_plan_id,
+        models.ShoppingList.user_id,
+        models.ShoppingList.start_date,
+        models.ShoppingList.end_date,
+        models.ShoppingList.created_at,
+        models.ShoppingList.status,
+        models.ShoppingList.export_format,
+        models.ShoppingList.version,
+    ).where(*list_filters(meal_plan_id, status, cursor)).order_by(
+        models.ShoppingList.created_at.desc(), models.ShoppingList.id.desc()
+    ).limit(limit + 1).subquery()
+    item = models.ShoppingListItem
+    rows = db.execute(
+        select(
+            page_lists,
+            item.category,
+            func.count(item.id).label('item_count'),
+            func.coalesce(func.sum(case((item.status == 'purchased', 1), else_=0)), 0).label('purchased_count'),
+        )
+        .select_from(page_lists)
+        .outerjoin(item, item.shopping_list_id == page_lists.c.id)
+        .group_by(*page_lists.c, item.category)
+        .order_by(page_lists.c.created_at.desc(), page_lists.c.id.desc())
+    ).all()
+    
+    summaries = {}
+    for row in rows:
+        summary = summaries.get(row.id)
+        if summary is None:
+            summary = summaries[row.id] = schemas.ShoppingListSummary(
+                id=row.id,
+                meal_plan_id=row.meal_plan_id,
+                user_id=row.user_id,
+                start_date=row.start_date,
+                end_date=row.end_date,
+                created_at=row.created_at,
+                status=row.status,
+                export_format=row.export_format,
+                version=row.version,
+                item_count=0,
+                purchased_count=0,
+                categories={}
+            )
+        if row.item_count:
+            summary.item_count += row.item_count
+            summary.purchased_count += row.purchased_count
+            summary.categories[row.category or 'Other'] = summary.categories.get(row.category or 'Other', 0) + row.item_count
+    page, more = split_page(list(summaries.values()), limit)
+    set_next_cursor(response, page, more)
+    return page
+
+def find_household_list(db: Session, **key) -> Optional[tuple]:
+    """(id, version) of the household list stored under `key`, if any."""
+    return db.query(models.ShoppingList.id, models.ShoppingList.version).filter_by(**key).first()
+
+@router.get("/household", response_model=schemas.ShoppingList)
+async def household_shopping_list(
+    user_id: int,
+    start_date: datetime,
+    end_date: datetime,
+    request: Request,
+    response: Response,
+    db: Session = Depends(get_db)
+):
+    """One list for every plan of the user, over entries dated start_date..end_date inclusive.
+
+    Lists are unique per (user, dates, entries hash); when a concurrent
+    request stores the same list first, its list is returned instead.
+    """
+    start_date, end_date = naive_utc(start_date), naive_utc(end_date)
+    if end_date < start_date:
+        raise HTTPException(status_code=400, detail="end_date must not be before start_date")
+    
+    criteria = household_entries(user_id, start_date, end_date)
+    key = dict(user_id=user_id, start_date=start_date, end_date=end_date, source_version=query_entries_hash(db, *criteria))
+    shopping_list = None
+    current = find_household_list(db, **key)
+    if current is None:
+        try:
+            shopping_list = store_shopping_list(db, ingredient_totals(db, *criteria), **key)
+            current = (shopping_list.id, shopping_list.version)
+        except IntegrityError:
+            db.rollback()
+            current = find_household_list(db, **key)
+    
+    etag = shopping_list_etag(*current)
+    if etag_matches(request.headers.get('if-none-match'), etag):
+        return Response(status_code=304, headers={'ETag': etag})
+    response.headers['ETag'] = etag
+    return shopping_list or load_shopping_list(current[0], db)
 
 @router.get("/{shopping_list_id}", response_model=schemas.ShoppingList)
 async def get_shopping_list(shopping_list_id: int, db: Session = Depends(get_db)):
-    shopping_list = db.query(models.ShoppingList).filter(models.ShoppingList.id == shopping_list_id).first()
+    shopping_list = load_shopping_list(shopping_list_id, db)
     if not shopping_list:
         raise HTTPException(status_code=404, detail="Shopping list not found")
     return shopping_list
@@ -68,27 +217,101 @@ async def delete_shopping_list(shopping_list_id: int, db: Session = Depends(get_
     db.commit()
     return {"message": "Shopping list deleted successfully"}
 
+def bump_version(db: Session, shopping_list_id: int, updated_items: int, **values) -> schemas.ShoppingListVersion:
+    """Bump the list's version (and set `values`) in one UPDATE ... RETURNING, then commit.
+
+    When no item changed and the list already has `values`, the version is
+    left alone and the current one returned, so cached exports stay valid.
+    """
+    columns = (models.ShoppingList.id, models.ShoppingList.status, models.ShoppingList.version)
+    changed = [getattr(models.ShoppingList, name) != value for name, value in values.items()]
+    row = None
+    if updated_items or changed:
+        statement = update(models.ShoppingList).where(models.ShoppingList.id == shopping_list_id)
+        if not updated_items:
+            statement = statement.where(or_(*changed))
+        row = db.execute(
+            statement.values(version=models.ShoppingList.version + 1, **values).returning(*columns)
+        ).first()
+    if row is None:
+        row = db.query(*columns).filter(models.ShoppingList.id == shopping_list_id).first()
+        if row is None:
+            db.rollback()
+            raise HTTPException(status_code=404, detail="Shopping list not found")
+    db.commit()
+    return schemas.ShoppingListVersion(id=row.id, status=row.status, version=row.version, updated_items=updated_items)
+
+@router.patch("/{shopping_list_id}/items", response_model=schemas.ShoppingListVersion)
+async def update_item_statuses(
+    shopping_list_id: int,
+    update_request: schemas.ShoppingListItemStatusUpdate,
+    db: Session = Depends(get_db)
+):
+    """Mark many items purchased or pending at once; ids not on this list are ignored.
+
+    Items already in that status are not counted, and when none change the
+    list keeps its version.
+    """
+    updated = 0
+    if update_request.item_ids:
+        updated = db.execute(
+            update(models.ShoppingListItem)
+            .where(
+                models.ShoppingListItem.shopping_list_id == shopping_list_id,
+                models.ShoppingListItem.id.in_(set(update_request.item_ids)),
+                models.ShoppingListItem.status != update_request.status
+            )
+            .values(status=update_request.status)
+            .execution_options(synchronize_session=False)
+        ).rowcount
+    return bump_version(db, shopping_list_id, updated)
+
+@router.post("/{shopping_list_id}/complete", response_model=schemas.ShoppingListVersion)
+async def complete_shopping_list(shopping_list_id: int, db: Session = Depends(get_db)):
+    """Mark every item purchased and the list completed."""
+    updated = db.execute(
+        update(models.ShoppingListItem)
+        .where(
+            models.ShoppingListItem.shopping_list_id == shopping_list_id,
+            models.ShoppingListItem.status != 'purchased'
+        )
+        .values(status='purchased')
+        .execution_options(synchronize_session=False)
+    ).rowcount
+    return bump_version(db, shopping_list_id, updated, status='completed')
+
 @router.get("/{shopping_list_id}/export")
 async def export_shopping_list(shopping_list_id: int, format: str = "ios_reminders", db: Session = Depends(get_db)):
-    shopping_list = db.query(models.ShoppingList).filter(models.ShoppingList.id == shopping_list_id).first()
+    exporter = EXPORTERS.get(format)
+    if exporter is None:
+        raise HTTPException(status_code=400, detail="Unsupported export format")
+    
+    shopping_list = db.query(models.ShoppingList.id, models.ShoppingList.version).filter(
+        models.ShoppingList.id == shopping_list_id
+    ).first()
     if not shopping_list:
         raise HTTPException(status_code=404, detail="Shopping list not found")
     
-    if format == "ios_reminders":
-        # Group items by category
-        categories = defaultdict(list)
-        for item in shopping_list.items:
-            categories[item.category].append(
-                f"{item.quantity} {item.unit} {item.ingredient.name}"
-            )
-        
-        # Format for iOS Reminders
-        reminder_text = ""
-        for category, items in categories.items():
-            reminder_text += f"\n{category}:\n"
-            reminder_text += "\n".join(f"☐ {item}" for item in items)
-            reminder_text += "\n"
-        
-        return {"format": "ios_reminders", "content": reminder_text.strip()}
-    else:
-        raise HTTPException(status_code=400, detail="Unsupported export format")
\ No newline at end of file
+    headers = {}
+    if format != "ios_reminders":
+        headers["Content-Disposition"] = f'attachment; filename="shopping-list-{shopping_list_id}.{exporter.extension}"'
+    
+    key = (shopping_list.id, shopping_list.version, format)
+    cached = export_cache.get(key)
+    if cached is not None:
+        return StreamingResponse(iter(cached), media_type=exporter.media_type, headers=headers)
+    
+    # Items and ingredient names in one joined query, copied out of the
+    # session so rendering can run after the request's session is closed
+    items = db.query(models.ShoppingListItem).options(
+        joinedload(models.ShoppingListItem.ingredient)
+    ).filter(models.ShoppingListItem.shopping_list_id == shopping_list_id).all()
+    rows = sorted(
+        (
+            ExportItem(item.id, item.category, item.ingredient.name, item.quantity, item.unit, item.status)
+            for item in items
+        ),
+        key=lambda item: (item.category or 'Other', item.name, item.id)
+    )
+    chunks = export_cache.stream(key, exporter.render(shopping_list_id, rows))
+    return StreamingResponse(chunks, media_type=exporter.media_type, headers=headers)
\ No newline at end of file
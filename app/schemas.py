@@ -1,5 +1,5 @@
 from datetime import datetime
-from typing import List, Optional, Dict
+from typing import List, Literal, Optional, Dict
 from pydantic import BaseModel, ConfigDict
 
 class IngredientBase(BaseModel):
@@ -10,6 +10,8 @@ class IngredientBase(BaseModel):
     protein: float
     carbs: float
     fats: float
+    density: Optional[float] = None
+    piece_weight: Optional[float] = None
 
 class IngredientCreate(IngredientBase):
     pass
@@ -18,6 +20,10 @@ class Ingredient(IngredientBase):
     id: int
     model_config = ConfigDict(from_attributes=True)
 
+class IngredientSuggestion(BaseModel):
+    id: int
+    name: str
+
 class RecipeIngredientBase(BaseModel):
     ingredient_id: int
     quantity: float
@@ -50,12 +56,44 @@ class RecipeBase(BaseModel):
 class RecipeCreate(RecipeBase):
     ingredients: List[RecipeIngredientCreate]
 
+class RecipeImportIngredient(BaseModel):
+    """An ingredient line to import: by id, or by value as exported (matched on name)."""
+    ingredient_id: Optional[int] = None
+    ingredient: Optional[IngredientCreate] = None
+    quantity: float
+    unit: str
+
+class RecipeImport(RecipeBase):
+    ingredients: List[RecipeImportIngredient]
+
+class RecipeImportResult(BaseModel):
+    imported: int
+    created_ingredients: int
+
 class Recipe(RecipeBase):
     id: int
     created_at: datetime
+    computed_calories: Optional[float] = None
+    computed_protein: Optional[float] = None
+    computed_carbs: Optional[float] = None
+    computed_fats: Optional[float] = None
     ingredients: List[RecipeIngredient]
     model_config = ConfigDict(from_attributes=True)
 
+class RecipeSummary(BaseModel):
+    """Browse view of a recipe: no instructions, tags or ingredients."""
+    id: int
+    name: str
+    category: Optional[str] = None
+    servings: int
+    prep_time: Optional[int] = None
+    cook_time: Optional[int] = None
+    calories: Optional[int] = None
+    protein: Optional[float] = None
+    carbs: Optional[float] = None
+    fats: Optional[float] = None
+    model_config = ConfigDict(from_attributes=True)
+
 class MealPlanEntryBase(BaseModel):
     recipe_id: int
     date: datetime
@@ -88,6 +126,16 @@ class MealPlan(MealPlanBase):
     entries: List[MealPlanEntry]
     model_config = ConfigDict(from_attributes=True)
 
+class MealPlanJob(BaseModel):
+    id: str
+    status: str
+    created_at: datetime
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+    meal_plan_id: Optional[int] = None
+    error: Optional[str] = None
+    model_config = ConfigDict(from_attributes=True)
+
 class ShoppingListItemBase(BaseModel):
     ingredient_id: int
     quantity: float
@@ -102,7 +150,7 @@ class ShoppingListItem(ShoppingListItemBase):
     model_config = ConfigDict(from_attributes=True)
 
 class ShoppingListBase(BaseModel):
-    meal_plan_id: int
+    meal_plan_id: Optional[int] = None
     status: str = 'active'
     export_format: Optional[str] = None
 
@@ -112,9 +160,34 @@ class ShoppingListCreate(ShoppingListBase):
 class ShoppingList(ShoppingListBase):
     id: int
     created_at: datetime
+    version: int = 1
+    user_id: Optional[int] = None
+    start_date: Optional[datetime] = None
+    end_date: Optional[datetime] = None
     items: List[ShoppingListItem]
     model_config = ConfigDict(from_attributes=True)
 
+class ShoppingListSummary(ShoppingListBase):
+    id: int
+    created_at: datetime
+    version: int = 1
+    user_id: Optional[int] = None
+    start_date: Optional[datetime] = None
+    end_date: Optional[datetime] = None
+    item_count: int
+    purchased_count: int
+    categories: Dict[str, int]  # item count per category
+
+class ShoppingListItemStatusUpdate(BaseModel):
+    item_ids: List[int]
+    status: Literal['pending', 'purchased']
+
+class ShoppingListVersion(BaseModel):
+    id: int
+    status: str
+    version: int
+    updated_items: int
+
 class UserBase(BaseModel):
     email: str
     calorie_target: int
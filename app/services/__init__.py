@@ -1 +1,14 @@
-from .meal_plan_generator import MealPlanGenerator
\ No newline at end of file
+from .exporters import EXPORTERS, ExportItem, export_cache
+from .meal_plan_generator import MealPlanGenerator, naive_utc
+from .name_matching import AutocompleteIndex, fuzzy_name_filter, ingredient_autocomplete, normalize_name
+from .nutrient_index import NutrientIndex
+from .nutrition import backfill_nutrition, refresh_ingredient_nutrition, refresh_recipe_nutrition
+from .plan_hash import entries_hash, query_entries_hash, refresh_entries_hash
+from .plan_jobs import PlanJob, PlanJobQueue, QueueFullError
+from . import recipe_search
+from .recipe_catalog import CatalogSnapshot, RecipeCatalog, RecipeRecord, recipe_catalog
+from . import recipe_transfer
+from .shopping import (
+    apply_deltas, household_entries, ingredient_deltas, ingredient_totals, refresh_ingredient_lists, update_shopping_lists
+)
+from .tag_index import TagIndex, filter_by_tags, matching_records
\ No newline at end of file
@@ -0,0 +1,43 @@
+from bisect import bisect_left, bisect_right
+from typing import Dict, List, Sequence, Tuple
+from .recipe_catalog import CatalogSnapshot, RecipeRecord
+from .tag_index import matching_records
+
+MEAL_TYPES = ('breakfast', 'lunch', 'dinner')
+
+
+class CalorieIndex:
+    """Recipes suitable for one meal type (weight > 0), sorted by calories.
+
+    Window lookups are binary searches, so nothing is copied or re-sorted
+    per slot. Weighted draws inside a window go through the alias tables in
+    `sampling`; the out-of-window fallback goes through `nutrient_index`.
+    """
+
+    def __init__(self, records: Sequence[RecipeRecord], meal_type: str):
+        weight_attr = f'{meal_type}_weight'
+        candidates = sorted(
+            (r for r in records if getattr(r, weight_attr) > 0),
+            key=lambda r: r.calories
+        )
+        self.meal_type = meal_type
+        self.records: List[RecipeRecord] = candidates
+        self.calories: List[float] = [r.calories for r in candidates]
+        self.weights: List[float] = [getattr(r, weight_attr) for r in candidates]
+        self.position_of: Dict[int, int] = {r.id: i for i, r in enumerate(candidates)}
+
+    def __len__(self) -> int:
+        return len(self.records)
+
+    @classmethod
+    def for_snapshot(cls, snapshot: CatalogSnapshot, dietary_preferences: Sequence[str]) -> Dict[str, 'CalorieIndex']:
+        key = ('calorie_index', tuple(sorted(set(dietary_preferences))))
+
+        def build(snap: CatalogSnapshot) -> Dict[str, 'CalorieIndex']:
+            records = matching_records(snap, dietary_preferences)
+            return {meal_type: cls(records, meal_type) for meal_type in MEAL_TYPES}
+
+        return snapshot.derived(key, build)
+
+    def window(self, min_calories: float, max_calories: float) -> Tuple[int, int]:
+        return bisect_left(self.calories, min_calories), bisect_right(self.calories, max_calories)
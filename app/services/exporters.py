@@ -0,0 +1,192 @@
+import csv
+import io
+import json
+import os
+import threading
+from collections import OrderedDict
+from datetime import datetime
+from itertools import groupby
+from typing import Dict, Iterator, List, NamedTuple, Optional, Sequence, Tuple
+
+EXPORT_CACHE_SIZE = int(os.getenv("EXPORT_CACHE_SIZE", "128"))  # rendered exports kept in memory
+
+
+class ExportItem(NamedTuple):
+    id: int
+    category: Optional[str]
+    name: str
+    quantity: float
+    unit: str
+    status: str
+
+
+def format_quantity(quantity: Optional[float]) -> str:
+    return f"{round(quantity or 0.0, 2):g}"
+
+
+def by_category(items: Sequence[ExportItem]):
+    return groupby(items, key=lambda item: item.category or 'Other')
+
+
+class Exporter:
+    """Renders a shopping list's items as a stream of text chunks.
+
+    Items arrive sorted by category and name. Subclasses register
+    themselves in EXPORTERS under `format`.
+    """
+
+    format = ''
+    media_type = 'text/plain; charset=utf-8'
+    extension = 'txt'
+
+    def render(self, shopping_list_id: int, items: Sequence[ExportItem]) -> Iterator[str]:
+        raise NotImplementedError
+
+
+class IOSRemindersExporter(Exporter):
+    """The original JSON envelope: {"format": "ios_reminders", "content": "..."}."""
+
+    format = 'ios_reminders'
+    media_type = 'application/json'
+    extension = 'json'
+
+    def render(self, shopping_list_id, items):
+        yield '{"format": "ios_reminders", "content": "'
+        for i, (category, group) in enumerate(by_category(items)):
+            lines = "\n".join(
+                f"☐ {format_quantity(item.quantity)} {item.unit} {item.name}" for item in group
+            )
+            text = f"{chr(10) * 2 if i else ''}{category}:\n{lines}"
+            # Escaping is per character, so chunks can be encoded one at a time
+            yield json.dumps(text, ensure_ascii=False)[1:-1]
+        yield '"}'
+
+
+class CSVExporter(Exporter):
+    format = 'csv'
+    media_type = 'text/csv; charset=utf-8'
+    extension = 'csv'
+
+    def render(self, shopping_list_id, items):
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(('category', 'ingredient', 'quantity', 'unit', 'status'))
+        for item in items:
+            writer.writerow((item.category or '', item.name, format_quantity(item.quantity), item.unit, item.status))
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+        yield buffer.getvalue()
+
+
+class MarkdownExporter(Exporter):
+    format = 'markdown'
+    media_type = 'text/markdown; charset=utf-8'
+    extension = 'md'
+
+    def render(self, shopping_list_id, items):
+        yield f"# Shopping list {shopping_list_id}\n"
+        for category, group in by_category(items):
+            yield f"\n## {category}\n\n"
+            for item in group:
+                mark = 'x' if item.status == 'purchased' else ' '
+                yield f"- [{mark}] {format_quantity(item.quantity)} {item.unit} {item.name}\n"
+
+
+class JSONLinesExporter(Exporter):
+    format = 'jsonl'
+    media_type = 'application/x-ndjson'
+    extension = 'jsonl'
+
+    def render(self, shopping_list_id, items):
+        for item in items:
+            yield json.dumps(item._asdict(), ensure_ascii=False) + "\n"
+
+
+def ical_text(value: str) -> str:
+    return value.replace('\\', '\\\\').replace(';', '\\;').replace(',', '\\,').replace('\n', '\\n')
+
+
+def ical_line(line: str) -> str:
+    """Fold a content line at 75 octets (RFC 5545 3.1)."""
+    encoded = line.encode('utf-8')
+    if len(encoded) <= 75:
+        return line + "\r\n"
+    parts, start, limit = [], 0, 75
+    while start < len(encoded):
+        end = min(start + limit, len(encoded))
+        # Don't split a multi-byte character
+        while end < len(encoded) and (encoded[end] & 0xC0) == 0x80:
+            end -= 1
+        parts.append(encoded[start:end].decode('utf-8'))
+        start, limit = end, 74  # continuation lines start with a space
+    return "\r\n ".join(parts) + "\r\n"
+
+
+class ICalendarExporter(Exporter):
+    """One VTODO per item, importable into Reminders and most task apps."""
+
+    format = 'ical'
+    media_type = 'text/calendar; charset=utf-8'
+    extension = 'ics'
+
+    def render(self, shopping_list_id, items):
+        stamp = datetime.utcnow().strftime('%Y%m%dT%H%M%SZ')
+        yield "BEGIN:VCALENDAR\r\nVERSION:2.0\r\nPRODID:-//Meal Planning API//Shopping list//EN\r\n"
+        for item in items:
+            status = 'COMPLETED' if item.status == 'purchased' else 'NEEDS-ACTION'
+            yield (
+                "BEGIN:VTODO\r\n"
+                + ical_line(f"UID:shopping-list-{shopping_list_id}-item-{item.id}@mealplanner")
+                + f"DTSTAMP:{stamp}\r\n"
+                + ical_line(f"SUMMARY:{ical_text(f'{format_quantity(item.quantity)} {item.unit} {item.name}')}")
+                + ical_line(f"CATEGORIES:{ical_text(item.category or 'Other')}")
+                + f"STATUS:{status}\r\n"
+                + "END:VTODO\r\n"
+            )
+        yield "END:VCALENDAR\r\n"
+
+
+EXPORTERS: Dict[str, Exporter] = {
+    exporter.format: exporter
+    for exporter in (IOSRemindersExporter(), CSVExporter(), MarkdownExporter(), JSONLinesExporter(), ICalendarExporter())
+}
+
+
+class ExportCache:
+    """Rendered exports keyed by (list id, list version, format), least recently used evicted.
+
+    A list's version changes whenever its items do, and when one of its
+    ingredients is renamed or recategorized (see refresh_ingredient_lists),
+    so entries never need invalidating; stale versions just age out.
+    """
+
+    def __init__(self, size: int = EXPORT_CACHE_SIZE):
+        self.size = size
+        self._entries: 'OrderedDict[Tuple[int, int, str], List[str]]' = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Tuple[int, int, str]) -> Optional[List[str]]:
+        with self._lock:
+            chunks = self._entries.get(key)
+            if chunks is not None:
+                self._entries.move_to_end(key)
+            return chunks
+
+    def put(self, key: Tuple[int, int, str], chunks: List[str]) -> None:
+        with self._lock:
+            self._entries[key] = chunks
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.size:
+                self._entries.popitem(last=False)
+
+    def stream(self, key: Tuple[int, int, str], chunks: Iterator[str]) -> Iterator[str]:
+        """Pass `chunks` through, caching them once the render completes."""
+        rendered = []
+        for chunk in chunks:
+            rendered.append(chunk)
+            yield chunk
+        self.put(key, rendered)
+
+
+export_cache = ExportCache()
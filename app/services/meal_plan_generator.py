@@ -1,13 +1,50 @@
-from typing import List, Dict, Set, Optional
-from datetime import datetime, timedelta
+from typing import Iterator, List, Dict, Set, Optional, Tuple
+from datetime import datetime, timedelta, timezone
+from sqlalchemy import insert
 from sqlalchemy.orm import Session
 from collections import defaultdict
+import itertools
 import random
+import numpy as np
 from .. import models, schemas
+from ..query_options import RECIPE_OPTIONS
+from .nutrient_index import NutrientIndex
+from .plan_hash import entries_hash, refresh_entries_hash
+from .recipe_catalog import CatalogSnapshot, RecipeCatalog, RecipeRecord, recipe_catalog
+from .sampling import BucketTables, RecipeSampler
+from .tag_index import matching_records
+from .vectorized_generator import MAX_USES, RecipeColumns, VectorizedMealPlanEngine
+
+ENGINES = ('python', 'numpy')
+# Days of entries written per commit by stream_meal_plan
+STREAM_BATCH_DAYS = 30
+
+
+def naive_utc(value: datetime) -> datetime:
+    """Dates are stored naive, in UTC; an aware start date is converted once up front."""
+    if value.tzinfo is None:
+        return value
+    return value.astimezone(timezone.utc).replace(tzinfo=None)
+
 
 class MealPlanGenerator:
-    def __init__(self, db: Session):
+    def __init__(
+        self,
+        db: Session,
+        catalog: RecipeCatalog = recipe_catalog,
+        engine: str = 'python',
+        seed: Optional[int] = None
+    ):
+        if engine not in ENGINES:
+            raise ValueError(f"Unknown meal plan engine: {engine}")
         self.db = db
+        self.catalog = catalog
+        self.engine = engine
+        # A fixed seed makes runs reproducible (benchmarks, debugging)
+        self.seed = seed
+        self.rng = random.Random(seed)
+        self.samplers: Dict[str, RecipeSampler] = {}
+        self.nutrient_indexes: Dict[str, NutrientIndex] = {}
         self.used_recipes: Dict[int, int] = defaultdict(int)  # recipe_id -> usage count
         self.daily_calories: List[float] = []  # track calories for each day
 
@@ -19,60 +56,250 @@ class MealPlanGenerator:
         people_count: int,
         dietary_preferences: List[str],
         user_id: int
+    ) -> schemas.MealPlan:
+        start_date = naive_utc(start_date)
+        # Choose every meal before touching the database, so a plan that
+        # cannot be filled leaves nothing behind
+        daily_plan = self.plan_days(start_date, days, target_calories, dietary_preferences)
+        content_hash = entries_hash(
+            (recipe.id, start_date + timedelta(days=day), meal_type, people_count)
+            for day, daily_meals in enumerate(daily_plan)
+            for meal_type, recipe in daily_meals.items()
+        )
+
+        # Create meal plan; flush assigns its id inside the same transaction
+        meal_plan = self._create_meal_plan(
+            start_date, days, target_calories, people_count, dietary_preferences, user_id, content_hash
+        )
+
+        # Create meal plan entries with one multi-row INSERT ... RETURNING
+        rows = [
+            row
+            for day, daily_meals in enumerate(daily_plan)
+            for row in self._entry_rows(meal_plan.id, start_date + timedelta(days=day), daily_meals, people_count)
+        ]
+        # (date, meal_type) is unique within a generated plan, so returned ids
+        # are matched on it rather than forcing ordered, row-at-a-time RETURNING.
+        # Dates are naive UTC (see naive_utc), as the database returns them.
+        returned = self.db.execute(
+            insert(models.MealPlanEntry).returning(
+                models.MealPlanEntry.id, models.MealPlanEntry.date, models.MealPlanEntry.meal_type
+            ),
+            rows
+        ).all() if rows else []
+        ids_by_slot = {(r.date, r.meal_type): r.id for r in returned}
+        entry_ids = [ids_by_slot[(row['date'], row['meal_type'])] for row in rows]
+
+        # Build the response before committing: commit expires the plan
+        response = self._build_response(meal_plan, rows, entry_ids)
+        self.db.commit()
+        return response
+
+    def stream_meal_plan(
+        self,
+        start_date: datetime,
+        days: int,
+        target_calories: int,
+        people_count: int,
+        dietary_preferences: List[str],
+        user_id: int,
+        batch_days: int = STREAM_BATCH_DAYS
+    ) -> Iterator[Tuple[str, object]]:
+        """Generate a plan day by day, yielding events as meals are chosen.
+
+        Yields ('meal_plan', MealPlan) once, then ('day', (date, meals)) per
+        day. Entries are written and committed every `batch_days` days, so
+        memory does not grow with the length of the plan. If the plan cannot
+        be filled, what was written is removed and ('error', message) ends
+        the stream; the same cleanup runs if the generator is closed early.
+        """
+        start_date = naive_utc(start_date)
+        daily_plan = self.iter_days(start_date, days, target_calories, dietary_preferences)
+        # Fail before creating anything if no recipe matches at all
+        first_day = next(daily_plan, None)
+
+        meal_plan = self._create_meal_plan(start_date, days, target_calories, people_count, dietary_preferences, user_id)
+        meal_plan_id = meal_plan.id
+        self.db.commit()
+
+        rows: List[dict] = []
+        current_date = start_date
+        try:
+            yield 'meal_plan', meal_plan
+            for daily_meals in itertools.chain([first_day] if first_day else [], daily_plan):
+                yield 'day', (current_date, daily_meals)
+                rows.extend(self._entry_rows(meal_plan_id, current_date, daily_meals, people_count))
+                current_date += timedelta(days=1)
+                if len(rows) >= batch_days * len(daily_meals):
+                    self.db.execute(insert(models.MealPlanEntry), rows)
+                    self.db.commit()
+                    rows = []
+        except ValueError as e:
+            self._discard_meal_plan(meal_plan_id)
+            yield 'error', str(e)
+            return
+        except GeneratorExit:
+            # Closed mid-stream (client gone): don't leave a partial, unhashed plan
+            self._discard_meal_plan(meal_plan_id)
+            raise
+
+        if rows:
+            self.db.execute(insert(models.MealPlanEntry), rows)
+        refresh_entries_hash(self.db, meal_plan_id)
+        self.db.commit()
+
+    def _discard_meal_plan(self, meal_plan_id: int) -> None:
+        self.db.rollback()
+        self.db.query(models.MealPlanEntry).filter(models.MealPlanEntry.meal_plan_id == meal_plan_id).delete()
+        self.db.query(models.MealPlan).filter(models.MealPlan.id == meal_plan_id).delete()
+        self.db.commit()
+
+    def plan_days(
+        self,
+        start_date: datetime,
+        days: int,
+        target_calories: int,
+        dietary_preferences: List[str]
+    ) -> List[Dict[str, RecipeRecord]]:
+        """Pick breakfast, lunch and dinner for each day without writing anything."""
+        if self.engine == 'numpy':
+            snapshot = self.catalog.snapshot(self.db)
+            return self._plan_vectorized(snapshot, days, target_calories, dietary_preferences)
+        return list(self.iter_days(start_date, days, target_calories, dietary_preferences))
+
+    def iter_days(
+        self,
+        start_date: datetime,
+        days: int,
+        target_calories: int,
+        dietary_preferences: List[str]
+    ) -> Iterator[Dict[str, RecipeRecord]]:
+        # Get all suitable recipes from the shared in-memory catalog
+        snapshot = self.catalog.snapshot(self.db)
+        if self.engine == 'numpy':
+            return self._iter_vectorized(snapshot, days, target_calories, dietary_preferences)
+        return self._iter_sequential(snapshot, start_date, days, target_calories, dietary_preferences)
+
+    def _create_meal_plan(
+        self,
+        start_date: datetime,
+        days: int,
+        target_calories: int,
+        people_count: int,
+        dietary_preferences: List[str],
+        user_id: int,
+        content_hash: Optional[str] = None
     ) -> models.MealPlan:
-        # Create meal plan
         meal_plan = models.MealPlan(
             user_id=user_id,
             start_date=start_date,
             end_date=start_date + timedelta(days=days),
             people_count=people_count,
             target_calories=target_calories,
-            dietary_preferences=dietary_preferences
+            dietary_preferences=dietary_preferences,
+            entries_hash=content_hash
         )
         self.db.add(meal_plan)
-        self.db.commit()
-        self.db.refresh(meal_plan)
+        self.db.flush()
+        return meal_plan
 
-        # Get all suitable recipes
-        recipes = self.db.query(models.Recipe).all()
-        suitable_recipes = [r for r in recipes 
-                          if all(pref in r.dietary_tags for pref in dietary_preferences) or not dietary_preferences]
+    @staticmethod
+    def _entry_rows(meal_plan_id: int, date: datetime, daily_meals: Dict[str, RecipeRecord], servings: int) -> List[dict]:
+        return [
+            {
+                'meal_plan_id': meal_plan_id,
+                'recipe_id': recipe.id,
+                'date': date,
+                'meal_type': meal_type,
+                'servings': servings
+            }
+            for meal_type, recipe in daily_meals.items()
+        ]
 
-        if not suitable_recipes:
+    def _build_response(self, meal_plan: models.MealPlan, rows: List[dict], entry_ids: List[int]) -> schemas.MealPlan:
+        # Every entry's recipe is loaded once, with its ingredients, instead of
+        # refreshing the plan and lazy-loading each entry on serialization
+        recipe_ids = {row['recipe_id'] for row in rows}
+        recipes = self.db.query(models.Recipe).options(*RECIPE_OPTIONS).filter(models.Recipe.id.in_(recipe_ids)).all() if recipe_ids else []
+        recipe_schemas = {r.id: schemas.Recipe.model_validate(r) for r in recipes}
+
+        return schemas.MealPlan(
+            id=meal_plan.id,
+            user_id=meal_plan.user_id,
+            start_date=meal_plan.start_date,
+            end_date=meal_plan.end_date,
+            people_count=meal_plan.people_count,
+            target_calories=meal_plan.target_calories,
+            dietary_preferences=meal_plan.dietary_preferences,
+            created_at=meal_plan.created_at,
+            entries=[
+                schemas.MealPlanEntry(id=entry_id, recipe=recipe_schemas[row['recipe_id']], **row)
+                for entry_id, row in zip(entry_ids, rows)
+            ]
+        )
+
+    def _iter_sequential(
+        self,
+        snapshot: CatalogSnapshot,
+        start_date: datetime,
+        days: int,
+        target_calories: int,
+        dietary_preferences: List[str]
+    ) -> Iterator[Dict[str, RecipeRecord]]:
+        if not matching_records(snapshot, dietary_preferences):
             raise ValueError("No recipes available matching dietary preferences")
 
+        # Alias tables over calorie-sorted candidates per meal type are shared
+        # until the catalog changes; samplers only track this run's removals.
+        tables = BucketTables.for_snapshot(snapshot, dietary_preferences)
+        self.samplers = {meal_type: RecipeSampler(tables[meal_type], self.rng) for meal_type in tables}
+        self.nutrient_indexes = {
+            meal_type: NutrientIndex.for_snapshot(snapshot, dietary_preferences, meal_type)
+            for meal_type in tables
+        }
+
         # Generate meals for each day
-        current_date = start_date
         for day in range(days):
-            daily_meals = self._generate_daily_meals(
-                suitable_recipes,
-                target_calories,
-                current_date
-            )
+            yield self._generate_daily_meals(target_calories, start_date + timedelta(days=day))
 
-            # Create meal plan entries
-            for meal_type, recipe in daily_meals.items():
-                entry = models.MealPlanEntry(
-                    meal_plan_id=meal_plan.id,
-                    recipe_id=recipe.id,
-                    date=current_date,
-                    meal_type=meal_type,
-                    servings=people_count
-                )
-                self.db.add(entry)
+    def _vectorized_engine(self, snapshot: CatalogSnapshot, dietary_preferences: List[str]) -> VectorizedMealPlanEngine:
+        columns = RecipeColumns.for_snapshot(snapshot, dietary_preferences)
+        if not columns.records:
+            raise ValueError("No recipes available matching dietary preferences")
+        return VectorizedMealPlanEngine(columns, rng=np.random.default_rng(self.seed))
 
-            current_date += timedelta(days=1)
+    def _track(self, daily_plan: List[Dict[str, RecipeRecord]]) -> List[Dict[str, RecipeRecord]]:
+        for daily_meals in daily_plan:
+            for recipe in daily_meals.values():
+                self.used_recipes[recipe.id] += 1
+            self.daily_calories.append(sum(meal.calories for meal in daily_meals.values()))
+        return daily_plan
 
-        self.db.commit()
-        self.db.refresh(meal_plan)
-        return meal_plan
+    def _plan_vectorized(
+        self,
+        snapshot: CatalogSnapshot,
+        days: int,
+        target_calories: int,
+        dietary_preferences: List[str]
+    ) -> List[Dict[str, RecipeRecord]]:
+        engine = self._vectorized_engine(snapshot, dietary_preferences)
+        return self._track(engine.plan(days, target_calories))
 
-    def _generate_daily_meals(self, recipes: List[models.Recipe], target_calories: int, date: datetime) -> Dict[str, models.Recipe]:
-        # Sort recipes by meal type weights
-        breakfast_recipes = self._filter_and_sort_recipes(recipes, 'breakfast_weight')
-        lunch_recipes = self._filter_and_sort_recipes(recipes, 'lunch_weight')
-        dinner_recipes = self._filter_and_sort_recipes(recipes, 'dinner_weight')
+    def _iter_vectorized(
+        self,
+        snapshot: CatalogSnapshot,
+        days: int,
+        target_calories: int,
+        dietary_preferences: List[str],
+        window: int = STREAM_BATCH_DAYS
+    ) -> Iterator[Dict[str, RecipeRecord]]:
+        # Plans `window` days per call, so the first day is out before the
+        # rest are chosen; the engine carries usage counts across windows
+        engine = self._vectorized_engine(snapshot, dietary_preferences)
+        for start in range(0, days, window):
+            yield from self._track(engine.plan(min(window, days - start), target_calories))
 
+    def _generate_daily_meals(self, target_calories: int, date: datetime) -> Dict[str, RecipeRecord]:
         # Calculate target calories per meal
         breakfast_target = target_calories * 0.25
         lunch_target = target_calories * 0.35
@@ -84,7 +311,6 @@ class MealPlanGenerator:
         # Select breakfast
         selected_meals['breakfast'] = self._select_recipe(
             'breakfast',
-            breakfast_recipes,
             breakfast_target,
             0.2  # 20% calorie deviation allowed
         )
@@ -92,7 +318,6 @@ class MealPlanGenerator:
         # Select lunch
         selected_meals['lunch'] = self._select_recipe(
             'lunch',
-            lunch_recipes,
             lunch_target,
             0.2,
             exclude_ids={selected_meals['breakfast'].id}
@@ -105,7 +330,6 @@ class MealPlanGenerator:
         )
         selected_meals['dinner'] = self._select_recipe(
             'dinner',
-            dinner_recipes,
             remaining_calories,
             0.25,  # Allow slightly more deviation for final meal
             exclude_ids={m.id for m in selected_meals.values()}
@@ -117,52 +341,33 @@ class MealPlanGenerator:
 
         return selected_meals
 
-    def _filter_and_sort_recipes(
-        self,
-        recipes: List[models.Recipe],
-        weight_attr: str
-    ) -> List[models.Recipe]:
-        # Filter out recipes used twice already
-        available_recipes = [r for r in recipes if self.used_recipes[r.id] < 2]
-        # Sort by weight and randomize within weight groups
-        return sorted(
-            available_recipes,
-            key=lambda x: (getattr(x, weight_attr) * random.uniform(0.8, 1.2)),
-            reverse=True
-        )
-
     def _select_recipe(
         self,
         meal_type: str,
-        recipes: List[models.Recipe],
         target_calories: float,
         max_deviation: float,
         exclude_ids: Set[int] = None
-    ) -> models.Recipe:
+    ) -> RecipeRecord:
         if exclude_ids is None:
             exclude_ids = set()
 
-        weight_attr = f'{meal_type}_weight'
-        # Filter out excluded recipes
-        available_recipes = [r for r in recipes if r.id not in exclude_ids and getattr(r, weight_attr) > 0]
-
         # Try to find a recipe within the calorie range
-        min_calories = target_calories * (1 - max_deviation)
-        max_calories = target_calories * (1 + max_deviation)
-
-        suitable_recipes = [
-            r for r in available_recipes
-            if min_calories <= r.calories <= max_calories
-        ]
-        weights = [getattr(r, weight_attr) for r in suitable_recipes]
-
-        if suitable_recipes:
-            selected = random.choices(suitable_recipes, weights=weights, k=1)[0]
-        else:
-            # If no recipe in range, select the closest one
-            selected = min(available_recipes,
-                          key=lambda r: abs(r.calories - target_calories))
+        sampler = self.samplers[meal_type]
+        selected = sampler.draw(target_calories, max_deviation, exclude_ids)
+        if selected is None:
+            # If no recipe in range, select the closest one by calories and macros
+            index = self.nutrient_indexes[meal_type]
+            closest = index.nearest(
+                index.target_point(target_calories),
+                is_allowed=lambda r: r.id not in exclude_ids and self.used_recipes[r.id] < MAX_USES
+            )
+            selected = closest[0] if closest else None
+        if selected is None:
+            raise ValueError(f"Not enough recipes to fill {meal_type} slots")
 
-        # Update usage count
+        # Update usage count; capped recipes leave every meal type's sampler
         self.used_recipes[selected.id] += 1
-        return selected
\ No newline at end of file
+        if self.used_recipes[selected.id] >= MAX_USES:
+            for other in self.samplers.values():
+                other.remove(selected.id)
+        return selected
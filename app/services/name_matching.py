@@ -0,0 +1,141 @@
+import threading
+from bisect import bisect_left, insort
+from collections import defaultdict
+from typing import Dict, List, Optional, Set, Tuple
+from sqlalchemy import func, or_
+from sqlalchemy.orm import Query, Session
+from .. import models
+
+# Minimum trigram Jaccard similarity for a fuzzy autocomplete hit
+SIMILARITY_THRESHOLD = 0.3
+
+
+def normalize_name(name: Optional[str]) -> str:
+    """'  Яйця ' -> 'яйця': trimmed, inner whitespace collapsed, case-folded."""
+    return ' '.join((name or '').split()).casefold()
+
+
+def trigrams(text: str) -> Set[str]:
+    """pg_trgm-style trigrams: each word padded with two spaces in front, one behind."""
+    grams = set()
+    for word in text.split():
+        padded = f"  {word} "
+        grams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return grams
+
+
+def fuzzy_name_filter(db_query: Query, column, text: str, ranked: bool = True) -> Query:
+    """Substring or trigram-similar matches on `column`, most similar first if `ranked`.
+
+    On PostgreSQL both conditions are served by the pg_trgm GIN index on
+    the column; elsewhere this is a plain ILIKE.
+    """
+    pattern = f"%{text}%"
+    if db_query.session.get_bind().dialect.name != 'postgresql':
+        return db_query.filter(column.ilike(pattern))
+    db_query = db_query.filter(or_(column.ilike(pattern), column.op('%')(text)))
+    if ranked:
+        db_query = db_query.order_by(func.similarity(column, text).desc())
+    return db_query
+
+
+class AutocompleteIndex:
+    """In-process typeahead over names: prefix hits first, then trigram matches.
+
+    Prefixes are a binary search over the sorted normalized names; fuzzy
+    matches score shared trigrams from an inverted index. Loaded from the
+    database on first use, then kept current through `add`.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._loaded = False
+        self._sorted: List[Tuple[str, int]] = []
+        self._names: Dict[int, Tuple[str, str]] = {}  # id -> (normalized, display)
+        self._postings: Dict[str, Set[int]] = defaultdict(set)
+
+    def ensure_loaded(self, db: Session) -> None:
+        if self._loaded:
+            return
+        with self._lock:
+            if self._loaded:
+                return
+            for ingredient_id, name in db.query(models.Ingredient.id, models.Ingredient.name):
+                self._add(ingredient_id, name)
+            self._loaded = True
+
+    def add(self, ingredient_id: int, name: str) -> None:
+        """Index a new or renamed ingredient; a no-op until the index is loaded."""
+        with self._lock:
+            if self._loaded:
+                self._remove(ingredient_id)
+                self._add(ingredient_id, name)
+
+    def find(self, name: str) -> Optional[int]:
+        """Id of an ingredient with the same normalized name, if one is indexed."""
+        key = normalize_name(name)
+        with self._lock:
+            i = bisect_left(self._sorted, (key,))
+            if i < len(self._sorted) and self._sorted[i][0] == key:
+                return self._sorted[i][1]
+        return None
+
+    def invalidate(self) -> None:
+        with self._lock:
+            self._loaded = False
+            self._sorted = []
+            self._names = {}
+            self._postings = defaultdict(set)
+
+    def _add(self, ingredient_id: int, name: str) -> None:
+        normalized = normalize_name(name)
+        self._names[ingredient_id] = (normalized, name)
+        insort(self._sorted, (normalized, ingredient_id))
+        for gram in trigrams(normalized):
+            self._postings[gram].add(ingredient_id)
+
+    def _remove(self, ingredient_id: int) -> None:
+        entry = self._names.pop(ingredient_id, None)
+        if entry is None:
+            return
+        normalized = entry[0]
+        i = bisect_left(self._sorted, (normalized, ingredient_id))
+        if i < len(self._sorted) and self._sorted[i] == (normalized, ingredient_id):
+            del self._sorted[i]
+        for gram in trigrams(normalized):
+            self._postings[gram].discard(ingredient_id)
+
+    def suggest(self, text: str, limit: int = 10) -> List[Tuple[int, str]]:
+        """Up to `limit` (id, name) pairs: names starting with `text`, then similar names."""
+        query = normalize_name(text)
+        if not query or limit <= 0:
+            return []
+        with self._lock:
+            hits: List[int] = []
+            i = bisect_left(self._sorted, (query,))
+            while i < len(self._sorted) and len(hits) < limit and self._sorted[i][0].startswith(query):
+                hits.append(self._sorted[i][1])
+                i += 1
+
+            if len(hits) < limit:
+                query_grams = trigrams(query)
+                shared: Dict[int, int] = defaultdict(int)
+                for gram in query_grams:
+                    for ingredient_id in self._postings.get(gram, ()):
+                        shared[ingredient_id] += 1
+                seen = set(hits)
+                scored = []
+                for ingredient_id, count in shared.items():
+                    if ingredient_id in seen:
+                        continue
+                    name_grams = len(trigrams(self._names[ingredient_id][0]))
+                    score = count / (len(query_grams) + name_grams - count)
+                    if score >= SIMILARITY_THRESHOLD:
+                        scored.append((-score, self._names[ingredient_id][0], ingredient_id))
+                scored.sort()
+                hits.extend(ingredient_id for _, _, ingredient_id in scored[:limit - len(hits)])
+
+            return [(ingredient_id, self._names[ingredient_id][1]) for ingredient_id in hits]
+
+
+ingredient_autocomplete = AutocompleteIndex()
@@ -0,0 +1,145 @@
+import heapq
+from typing import Callable, List, Optional, Sequence, Tuple
+import numpy as np
+from .calorie_index import CalorieIndex
+from .recipe_catalog import CatalogSnapshot, RecipeRecord
+from .tag_index import matching_records
+
+LEAF_SIZE = 16
+
+
+def nutrient_matrix(records: Sequence[RecipeRecord]) -> np.ndarray:
+    return np.array(
+        [(r.calories, r.protein, r.carbs, r.fats) for r in records],
+        dtype=np.float64
+    ).reshape(-1, 4)
+
+
+def nutrient_scale(matrix: np.ndarray) -> np.ndarray:
+    """Per-dimension standard deviation, so calories don't drown out grams."""
+    if not len(matrix):
+        return np.ones(4)
+    scale = matrix.std(axis=0)
+    return np.where(scale > 0, scale, 1.0)
+
+
+def macro_ratios(matrix: np.ndarray) -> np.ndarray:
+    """Average grams of protein, carbs and fats per kcal across the records."""
+    total_calories = matrix[:, 0].sum() if len(matrix) else 0.0
+    if total_calories <= 0:
+        return np.zeros(3)
+    return matrix[:, 1:].sum(axis=0) / total_calories
+
+
+class NutrientIndex:
+    """KD-tree over normalized (calories, protein, carbs, fats) vectors.
+
+    Nodes live in flat lists; leaves hold up to LEAF_SIZE points. Queries
+    walk the tree in pure Python with a bounded heap, which on a few
+    hundred thousand recipes answers k-nearest lookups in well under a
+    millisecond.
+    """
+
+    def __init__(self, records: Sequence[RecipeRecord]):
+        self.records = list(records)
+        matrix = nutrient_matrix(self.records)
+        self.scale = nutrient_scale(matrix)
+        self.ratios = macro_ratios(matrix)
+        normalized = matrix / self.scale
+
+        self.split_dim: List[int] = []
+        self.split_value: List[float] = []
+        self.children: List[Tuple[int, int]] = []
+        self.order: List[int] = []
+        self.points: List[Tuple[float, ...]] = []
+        if self.records:
+            self._build(normalized, np.arange(len(self.records)))
+
+    @classmethod
+    def for_snapshot(
+        cls,
+        snapshot: CatalogSnapshot,
+        dietary_preferences: Sequence[str] = (),
+        meal_type: Optional[str] = None
+    ) -> 'NutrientIndex':
+        key = ('nutrient_index', tuple(sorted(set(dietary_preferences))), meal_type)
+
+        def build(snap: CatalogSnapshot) -> 'NutrientIndex':
+            if meal_type is None:
+                return cls(matching_records(snap, dietary_preferences))
+            return cls(CalorieIndex.for_snapshot(snap, dietary_preferences)[meal_type].records)
+
+        return snapshot.derived(key, build)
+
+    def _build(self, normalized: np.ndarray, members: np.ndarray) -> int:
+        node = len(self.split_dim)
+        self.split_dim.append(-1)
+        self.split_value.append(0.0)
+        self.children.append((0, 0))
+
+        if len(members) <= LEAF_SIZE:
+            start = len(self.order)
+            self.order.extend(int(i) for i in members)
+            self.points.extend(tuple(map(float, normalized[i])) for i in members)
+            self.children[node] = (start, len(self.order))
+            return node
+
+        values = normalized[members]
+        dim = int(np.argmax(values.max(axis=0) - values.min(axis=0)))
+        middle = len(members) // 2
+        partition = np.argpartition(values[:, dim], middle)
+        self.split_dim[node] = dim
+        self.split_value[node] = float(values[partition[middle], dim])
+        left = self._build(normalized, members[partition[:middle]])
+        right = self._build(normalized, members[partition[middle:]])
+        self.children[node] = (left, right)
+        return node
+
+    def query_point(self, calories: float, protein: float, carbs: float, fats: float) -> Tuple[float, ...]:
+        return tuple(float(v) for v in np.array([calories, protein, carbs, fats]) / self.scale)
+
+    def target_point(self, target_calories: float) -> Tuple[float, ...]:
+        """A point at the target calories with this index's average macro split."""
+        protein, carbs, fats = self.ratios * target_calories
+        return self.query_point(target_calories, protein, carbs, fats)
+
+    def nearest(
+        self,
+        point: Tuple[float, ...],
+        k: int = 1,
+        is_allowed: Optional[Callable[[RecipeRecord], bool]] = None
+    ) -> List[RecipeRecord]:
+        """Up to k allowed records closest to `point`, nearest first."""
+        if not self.records or k <= 0:
+            return []
+        heap: List[Tuple[float, int]] = []  # (-distance, position) max-heap
+        stack = [(0, 0.0)]
+        while stack:
+            node, bound = stack.pop()
+            if len(heap) == k and bound >= -heap[0][0]:
+                continue
+            dim = self.split_dim[node]
+            if dim < 0:
+                start, end = self.children[node]
+                for position in range(start, end):
+                    p = self.points[position]
+                    distance = (
+                        (p[0] - point[0]) ** 2 + (p[1] - point[1]) ** 2
+                        + (p[2] - point[2]) ** 2 + (p[3] - point[3]) ** 2
+                    )
+                    if len(heap) < k:
+                        if is_allowed is None or is_allowed(self.records[self.order[position]]):
+                            heapq.heappush(heap, (-distance, position))
+                    elif distance < -heap[0][0]:
+                        if is_allowed is None or is_allowed(self.records[self.order[position]]):
+                            heapq.heapreplace(heap, (-distance, position))
+                continue
+
+            diff = point[dim] - self.split_value[node]
+            left, right = self.children[node]
+            near, far = (left, right) if diff < 0 else (right, left)
+            # Visit the near side first: push the far side underneath it
+            stack.append((far, max(bound, diff * diff)))
+            stack.append((near, bound))
+
+        return [self.records[self.order[position]] for _, position in sorted(heap, reverse=True)]
@@ -0,0 +1,136 @@
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+import numpy as np
+from sqlalchemy import update
+from sqlalchemy.orm import Session
+from .. import models
+from .units import conversions_for
+
+NUTRIENTS = ('calories', 'protein', 'carbs', 'fats')
+COMPUTED_COLUMNS = tuple(f'computed_{nutrient}' for nutrient in NUTRIENTS)
+# Recipes per rollup query and UPDATE batch
+ROLLUP_BATCH_SIZE = 1000
+
+
+def nutrition_rows(db: Session, recipe_ids: Sequence[int]) -> list:
+    """One row per (recipe, ingredient line); recipes without ingredients get one empty row."""
+    return db.query(
+        models.Recipe.id.label('recipe_id'),
+        models.Recipe.servings,
+        models.RecipeIngredient.quantity,
+        models.RecipeIngredient.unit,
+        models.Ingredient.base_unit,
+        models.Ingredient.density,
+        models.Ingredient.piece_weight,
+        models.Ingredient.calories,
+        models.Ingredient.protein,
+        models.Ingredient.carbs,
+        models.Ingredient.fats,
+    ).outerjoin(
+        models.RecipeIngredient, models.RecipeIngredient.recipe_id == models.Recipe.id
+    ).outerjoin(
+        models.Ingredient, models.Ingredient.id == models.RecipeIngredient.ingredient_id
+    ).filter(models.Recipe.id.in_(recipe_ids)).all()
+
+
+def rollup(rows: Iterable) -> Dict[int, Tuple[float, float, float, float]]:
+    """Per-serving (calories, protein, carbs, fats) of each recipe in `rows`.
+
+    Ingredient nutrition is per base unit, so each line's quantity is
+    converted to the ingredient's base unit with the cached tables from
+    `units`; lines that can't be converted count as zero. The multiply and
+    per-recipe sum is one vectorized pass.
+    """
+    rows = list(rows)
+    if not rows:
+        return {}
+    slots: Dict[int, int] = {}
+    servings: List[float] = []
+    inverse = np.empty(len(rows), dtype=np.intp)
+    amounts = np.zeros(len(rows), dtype=np.float64)
+    per_unit = np.zeros((len(rows), len(NUTRIENTS)), dtype=np.float64)
+    for i, row in enumerate(rows):
+        slot = slots.setdefault(row.recipe_id, len(slots))
+        if slot == len(servings):
+            servings.append(float(row.servings or 1))
+        inverse[i] = slot
+        if row.quantity is None:
+            continue
+        conversions = conversions_for(row.base_unit, row.density, row.piece_weight)
+        unit, factor = conversions.convert(row.unit)
+        if unit == conversions.unit:
+            amounts[i] = row.quantity * factor
+            per_unit[i] = (row.calories or 0.0, row.protein or 0.0, row.carbs or 0.0, row.fats or 0.0)
+
+    contributions = per_unit * amounts[:, None]
+    totals = np.column_stack([
+        np.bincount(inverse, weights=contributions[:, n], minlength=len(slots))
+        for n in range(len(NUTRIENTS))
+    ]) / np.array(servings)[:, None]
+    return {recipe_id: tuple(float(v) for v in totals[slot]) for recipe_id, slot in slots.items()}
+
+
+def refresh_recipe_nutrition(db: Session, recipe_ids: Optional[Iterable[int]] = None) -> int:
+    """Recompute the materialized nutrition of the given recipes, or of all of them.
+
+    Runs in the caller's transaction and does not commit. Returns the
+    number of recipes updated.
+    """
+    if recipe_ids is None:
+        return _refresh_all(db)
+    recipe_ids = sorted(set(recipe_ids))
+    updated = 0
+    for start in range(0, len(recipe_ids), ROLLUP_BATCH_SIZE):
+        updated += _refresh_batch(db, recipe_ids[start:start + ROLLUP_BATCH_SIZE])
+    return updated
+
+
+def refresh_ingredient_nutrition(db: Session, ingredient_id: int) -> int:
+    """Recompute every recipe that uses the ingredient, after its nutrition or units changed."""
+    recipe_ids = [
+        recipe_id for (recipe_id,) in
+        db.query(models.RecipeIngredient.recipe_id).filter(models.RecipeIngredient.ingredient_id == ingredient_id)
+    ]
+    return refresh_recipe_nutrition(db, recipe_ids)
+
+
+def backfill_nutrition(db: Session) -> int:
+    """Compute nutrition for recipes stored before it was materialized, and commit."""
+    updated = 0
+    while True:
+        recipe_ids = [
+            recipe_id for (recipe_id,) in
+            db.query(models.Recipe.id).filter(models.Recipe.computed_calories.is_(None))
+            .order_by(models.Recipe.id).limit(ROLLUP_BATCH_SIZE)
+        ]
+        if not recipe_ids:
+            return updated
+        updated += _refresh_batch(db, recipe_ids)
+        db.commit()
+
+
+def _refresh_all(db: Session) -> int:
+    updated = 0
+    last_id = 0
+    while True:
+        recipe_ids = [
+            recipe_id for (recipe_id,) in
+            db.query(models.Recipe.id).filter(models.Recipe.id > last_id)
+            .order_by(models.Recipe.id).limit(ROLLUP_BATCH_SIZE)
+        ]
+        if not recipe_ids:
+            return updated
+        updated += _refresh_batch(db, recipe_ids)
+        last_id = recipe_ids[-1]
+
+
+def _refresh_batch(db: Session, recipe_ids: List[int]) -> int:
+    totals = rollup(nutrition_rows(db, recipe_ids))
+    if not totals:
+        return 0
+    # Bulk UPDATE by primary key: one executemany for the whole batch
+    db.execute(
+        update(models.Recipe),
+        [{'id': recipe_id, **dict(zip(COMPUTED_COLUMNS, values))} for recipe_id, values in totals.items()],
+        execution_options={'synchronize_session': False}
+    )
+    return len(totals)
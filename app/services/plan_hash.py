@@ -0,0 +1,39 @@
+import hashlib
+import json
+from datetime import datetime
+from typing import Iterable, Tuple
+from sqlalchemy import select, update
+from sqlalchemy.orm import Session
+from .. import models
+
+# (recipe_id, date, meal_type, servings)
+EntryKey = Tuple[int, datetime, str, int]
+
+
+def entries_hash(entries: Iterable[EntryKey]) -> str:
+    """Order-independent SHA-256 of a meal plan's entries."""
+    canonical = sorted(
+        (recipe_id, date.isoformat() if date is not None else None, meal_type or '', servings or 0)
+        for recipe_id, date, meal_type, servings in entries
+    )
+    return hashlib.sha256(json.dumps(canonical, separators=(',', ':')).encode()).hexdigest()
+
+
+def query_entries_hash(db: Session, *criteria) -> str:
+    """Hash of the meal plan entries matching `criteria`, read from the database."""
+    entries = db.execute(
+        select(
+            models.MealPlanEntry.recipe_id,
+            models.MealPlanEntry.date,
+            models.MealPlanEntry.meal_type,
+            models.MealPlanEntry.servings,
+        ).where(*criteria)
+    ).all()
+    return entries_hash(entries)
+
+
+def refresh_entries_hash(db: Session, meal_plan_id: int) -> str:
+    """Recompute a plan's entries hash from the database and store it (not committed)."""
+    value = query_entries_hash(db, models.MealPlanEntry.meal_plan_id == meal_plan_id)
+    db.execute(update(models.MealPlan).where(models.MealPlan.id == meal_plan_id).values(entries_hash=value))
+    return value
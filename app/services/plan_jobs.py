@@ -0,0 +1,119 @@
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Callable, Dict, Optional
+from sqlalchemy.orm import Session
+from .meal_plan_generator import MealPlanGenerator
+
+PLAN_JOB_WORKERS = int(os.getenv("PLAN_JOB_WORKERS", "2"))
+PLAN_JOB_QUEUE_LIMIT = int(os.getenv("PLAN_JOB_QUEUE_LIMIT", "16"))
+PLAN_JOB_RETENTION = int(os.getenv("PLAN_JOB_RETENTION", "3600"))  # seconds a finished job stays pollable
+PLAN_JOB_HISTORY = int(os.getenv("PLAN_JOB_HISTORY", "1024"))  # finished jobs kept at most, oldest dropped first
+
+
+class QueueFullError(Exception):
+    pass
+
+
+class PlanJob:
+    def __init__(self, params: dict):
+        self.id = uuid.uuid4().hex
+        self.status = 'queued'  # queued, running, completed, failed
+        self.params = params
+        self.created_at = datetime.utcnow()
+        self.started_at: Optional[datetime] = None
+        self.finished_at: Optional[datetime] = None
+        self.finished_monotonic: Optional[float] = None
+        # Only the id is kept: the plan itself is loaded when the result is asked for
+        self.meal_plan_id: Optional[int] = None
+        self.error: Optional[str] = None
+
+    @property
+    def done(self) -> bool:
+        return self.status in ('completed', 'failed')
+
+
+class PlanJobQueue:
+    """Runs meal plan generation off the request path on a bounded pool.
+
+    At most `queue_limit` jobs may be queued or running at once; further
+    submissions raise QueueFullError so bursts of plan requests are pushed
+    back to the client instead of piling up behind the other endpoints.
+    Finished jobs are kept for `retention` seconds, and no more than
+    `history` of them.
+    """
+
+    def __init__(
+        self,
+        session_factory: Callable[[], Session],
+        workers: int = PLAN_JOB_WORKERS,
+        queue_limit: int = PLAN_JOB_QUEUE_LIMIT,
+        retention: int = PLAN_JOB_RETENTION,
+        history: int = PLAN_JOB_HISTORY
+    ):
+        self.session_factory = session_factory
+        self.workers = workers
+        self.queue_limit = queue_limit
+        self.retention = retention
+        self.history = history
+        self._jobs: Dict[str, PlanJob] = {}
+        self._pending = 0
+        self._lock = threading.Lock()
+        self._executor: Optional[ThreadPoolExecutor] = None
+
+    def submit(self, **params) -> PlanJob:
+        with self._lock:
+            self._purge()
+            if self._pending >= self.queue_limit:
+                raise QueueFullError("Too many meal plans are being generated, retry later")
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='plan-job')
+            job = PlanJob(params)
+            self._jobs[job.id] = job
+            self._pending += 1
+        self._executor.submit(self._run, job)
+        return job
+
+    def get(self, job_id: str) -> Optional[PlanJob]:
+        with self._lock:
+            self._purge()
+            return self._jobs.get(job_id)
+
+    def _purge(self) -> None:
+        cutoff = time.monotonic() - self.retention
+        expired = [
+            job_id for job_id, job in self._jobs.items()
+            if job.finished_monotonic is not None and job.finished_monotonic < cutoff
+        ]
+        for job_id in expired:
+            del self._jobs[job_id]
+
+        finished = [job for job in self._jobs.values() if job.finished_monotonic is not None]
+        if len(finished) > self.history:
+            finished.sort(key=lambda job: job.finished_monotonic)
+            for job in finished[:len(finished) - self.history]:
+                del self._jobs[job.id]
+
+    def _run(self, job: PlanJob) -> None:
+        job.status = 'running'
+        job.started_at = datetime.utcnow()
+        params = dict(job.params)
+        db = self.session_factory()
+        try:
+            planner = MealPlanGenerator(db, engine=params.pop('engine'), seed=params.pop('seed'))
+            job.meal_plan_id = planner.generate_meal_plan(**params).id
+            job.status = 'completed'
+        except Exception as e:
+            db.rollback()
+            job.error = str(e)
+            job.status = 'failed'
+        finally:
+            db.close()
+            job.finished_at = datetime.utcnow()
+            job.finished_monotonic = time.monotonic()
+            with self._lock:
+                self._pending -= 1
+                self._purge()
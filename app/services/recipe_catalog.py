@@ -0,0 +1,145 @@
+import threading
+from typing import Any, Callable, Dict, FrozenSet, Iterable, List, Optional
+from sqlalchemy.orm import Session
+from .. import models
+
+
+class RecipeRecord:
+    """Compact, read-only view of the recipe columns the meal planner needs."""
+
+    __slots__ = (
+        'id',
+        'calories',
+        'protein',
+        'carbs',
+        'fats',
+        'breakfast_weight',
+        'lunch_weight',
+        'dinner_weight',
+        'dietary_tags',
+    )
+
+    def __init__(
+        self,
+        id: int,
+        calories: float,
+        protein: float,
+        carbs: float,
+        fats: float,
+        breakfast_weight: float,
+        lunch_weight: float,
+        dinner_weight: float,
+        dietary_tags: FrozenSet[str],
+    ):
+        self.id = id
+        self.calories = calories
+        self.protein = protein
+        self.carbs = carbs
+        self.fats = fats
+        self.breakfast_weight = breakfast_weight
+        self.lunch_weight = lunch_weight
+        self.dinner_weight = dinner_weight
+        self.dietary_tags = dietary_tags
+
+    def __repr__(self) -> str:
+        return f"RecipeRecord(id={self.id}, calories={self.calories})"
+
+
+class CatalogSnapshot:
+    """Immutable set of recipe records loaded for one catalog version.
+
+    Indexes built on top of the records are cached per snapshot through
+    `derived`, so they are rebuilt only when the catalog version changes.
+    """
+
+    def __init__(self, version: int, records: List[RecipeRecord]):
+        self.version = version
+        self.records = records
+        self.by_id: Dict[int, RecipeRecord] = {r.id: r for r in records}
+        self._derived: Dict[Any, Any] = {}
+
+    def derived(self, key: Any, factory: Callable[['CatalogSnapshot'], Any]) -> Any:
+        value = self._derived.get(key)
+        if value is None:
+            # Concurrent builders may race here; the structures are pure
+            # functions of the snapshot, so the last one written wins harmlessly.
+            value = factory(self)
+            self._derived[key] = value
+        return value
+
+
+def build_records(rows: Iterable) -> List[RecipeRecord]:
+    return [
+        RecipeRecord(
+            id=row.id,
+            # Hand-entered values win; zeros fall back to the ingredient rollup
+            calories=row.calories or row.computed_calories or 0,
+            protein=row.protein or row.computed_protein or 0.0,
+            carbs=row.carbs or row.computed_carbs or 0.0,
+            fats=row.fats or row.computed_fats or 0.0,
+            breakfast_weight=row.breakfast_weight or 0.0,
+            lunch_weight=row.lunch_weight or 0.0,
+            dinner_weight=row.dinner_weight or 0.0,
+            dietary_tags=frozenset(row.dietary_tags or ()),
+        )
+        for row in rows
+    ]
+
+
+def load_records(db: Session) -> List[RecipeRecord]:
+    # Column query: no ORM identity map, no relationship loading
+    rows = db.query(
+        models.Recipe.id,
+        models.Recipe.calories,
+        models.Recipe.protein,
+        models.Recipe.carbs,
+        models.Recipe.fats,
+        models.Recipe.computed_calories,
+        models.Recipe.computed_protein,
+        models.Recipe.computed_carbs,
+        models.Recipe.computed_fats,
+        models.Recipe.breakfast_weight,
+        models.Recipe.lunch_weight,
+        models.Recipe.dinner_weight,
+        models.Recipe.dietary_tags,
+    ).order_by(models.Recipe.id).all()
+    return build_records(rows)
+
+
+class RecipeCatalog:
+    """Process-level recipe catalog stamped with a version.
+
+    The recipes router calls `invalidate` after every committed write; the
+    next `snapshot` call reloads the table once and all following requests
+    share the result until the next write.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._version = 0
+        self._snapshot: Optional[CatalogSnapshot] = None
+
+    @property
+    def version(self) -> int:
+        return self._version
+
+    def invalidate(self) -> None:
+        with self._lock:
+            self._version += 1
+            self._snapshot = None
+
+    def snapshot(self, db: Session) -> CatalogSnapshot:
+        snapshot = self._snapshot
+        if snapshot is not None and snapshot.version == self._version:
+            return snapshot
+
+        with self._lock:
+            snapshot = self._snapshot
+            if snapshot is not None and snapshot.version == self._version:
+                return snapshot
+            snapshot = CatalogSnapshot(self._version, load_records(db))
+            self._snapshot = snapshot
+            return snapshot
+
+
+recipe_catalog = RecipeCatalog()
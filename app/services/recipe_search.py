@@ -0,0 +1,65 @@
+import os
+import re
+from typing import List, Optional
+from sqlalchemy import false, func, literal_column, or_
+from sqlalchemy.orm import Query
+from .. import models
+
+# Text search configuration for recipe content. PostgreSQL ships no
+# Ukrainian stemmer, so 'simple' (lowercasing, no stemming) is the
+# default; point this at a hunspell-based configuration if one is
+# installed. Changing it requires dropping recipes.search_vector so the
+# migration recreates it.
+RECIPE_SEARCH_CONFIG = os.getenv("RECIPE_SEARCH_CONFIG", "simple")
+if not re.fullmatch(r"[A-Za-z_][A-Za-z0-9_.]*", RECIPE_SEARCH_CONFIG):
+    raise ValueError(f"Invalid RECIPE_SEARCH_CONFIG: {RECIPE_SEARCH_CONFIG}")
+
+# Name outranks category, category outranks instructions
+SEARCH_VECTOR_SQL = (
+    f"setweight(to_tsvector('{RECIPE_SEARCH_CONFIG}', coalesce(name, '')), 'A') || "
+    f"setweight(to_tsvector('{RECIPE_SEARCH_CONFIG}', coalesce(category, '')), 'B') || "
+    f"setweight(to_tsvector('{RECIPE_SEARCH_CONFIG}', coalesce(instructions, '')), 'C')"
+)
+POSTGRES_DDL = [
+    f"ALTER TABLE recipes ADD COLUMN IF NOT EXISTS search_vector tsvector "
+    f"GENERATED ALWAYS AS ({SEARCH_VECTOR_SQL}) STORED",
+    "CREATE INDEX IF NOT EXISTS ix_recipes_search_vector ON recipes USING GIN (search_vector)",
+]
+
+search_vector = literal_column('recipes.search_vector')
+search_config = literal_column(f"'{RECIPE_SEARCH_CONFIG}'::regconfig")
+WORD = re.compile(r"\w+")
+
+
+def prefix_tsquery(query: str) -> Optional[str]:
+    """'борщ черв' -> 'борщ:* & черв:*', so partly typed words still match."""
+    terms: List[str] = WORD.findall(query.casefold())
+    if not terms:
+        return None
+    return ' & '.join(f"{term}:*" for term in terms)
+
+
+def search(db_query: Query, query: str) -> Query:
+    """Filter and order `db_query` (over models.Recipe) by a free-text query.
+
+    On PostgreSQL this matches the generated search_vector column through
+    its GIN index and ranks with ts_rank; elsewhere it falls back to ILIKE
+    over name, instructions and category.
+    """
+    if db_query.session.get_bind().dialect.name != 'postgresql':
+        pattern = f"%{query}%"
+        return db_query.filter(
+            or_(
+                models.Recipe.name.ilike(pattern),
+                models.Recipe.instructions.ilike(pattern),
+                models.Recipe.category.ilike(pattern)
+            )
+        )
+
+    text = prefix_tsquery(query)
+    if text is None:
+        return db_query.filter(false())
+    tsquery = func.to_tsquery(search_config, text)
+    return db_query.filter(search_vector.op('@@')(tsquery)).order_by(
+        func.ts_rank(search_vector, tsquery).desc(), models.Recipe.id
+    )
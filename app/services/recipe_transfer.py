@@ -0,0 +1,277 @@
+import json
+import os
+import zlib
+from typing import AsyncIterator, Dict, Iterator, List, Optional, Sequence, Tuple
+from pydantic import ValidationError
+from sqlalchemy import insert
+from sqlalchemy.orm import Session
+from .. import models, schemas
+from ..query_options import RECIPE_OPTIONS
+from .name_matching import ingredient_autocomplete, normalize_name
+from .nutrition import refresh_recipe_nutrition
+
+EXPORT_BATCH_SIZE = int(os.getenv("RECIPE_EXPORT_BATCH_SIZE", "1000"))  # rows per server-side cursor fetch
+IMPORT_BATCH_SIZE = int(os.getenv("RECIPE_IMPORT_BATCH_SIZE", "500"))  # recipes per import transaction
+MAX_LINE_BYTES = 1 << 20
+CHUNK_BYTES = 1 << 16
+GZIP_MAGIC = b'\x1f\x8b'
+
+
+class RecipeImportError(Exception):
+    """A record that cannot be imported; `line` is its 1-based position in the input."""
+
+    def __init__(self, line: int, detail: str):
+        super().__init__(detail)
+        self.line = line
+        self.detail = detail
+
+
+def export_documents(db: Session) -> Iterator[str]:
+    """Every recipe as a schemas.Recipe JSON document, in id order.
+
+    Rows are fetched EXPORT_BATCH_SIZE at a time through a server-side
+    cursor (stream_results on PostgreSQL), each batch with its ingredients,
+    and the session drops them again once serialized.
+    """
+    query = db.query(models.Recipe).options(*RECIPE_OPTIONS).order_by(models.Recipe.id)
+    for recipe in query.yield_per(EXPORT_BATCH_SIZE):
+        yield schemas.Recipe.model_validate(recipe).model_dump_json()
+
+
+def frame_documents(documents: Iterator[str], format: str) -> Iterator[str]:
+    """NDJSON lines, or the pieces of one JSON array."""
+    if format == 'ndjson':
+        for document in documents:
+            yield document + '\n'
+        return
+    yield '['
+    for i, document in enumerate(documents):
+        yield document if i == 0 else ',' + document
+    yield ']'
+
+
+def encode_chunks(pieces: Iterator[str], compress: bool = False) -> Iterator[bytes]:
+    """UTF-8 in CHUNK_BYTES blocks, gzip-compressed if asked for."""
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31) if compress else None
+    buffer: List[bytes] = []
+    size = 0
+    for piece in pieces:
+        data = piece.encode()
+        buffer.append(data)
+        size += len(data)
+        if size >= CHUNK_BYTES:
+            block = b''.join(buffer)
+            buffer, size = [], 0
+            block = compressor.compress(block) if compressor else block
+            if block:
+                yield block
+    block = b''.join(buffer)
+    if compressor:
+        block = compressor.compress(block) + compressor.flush()
+    if block:
+        yield block
+
+
+class Inflater:
+    """Gzip decompression in blocks of at most CHUNK_BYTES.
+
+    A small, highly compressed chunk can't expand past that before the
+    caller sees it; concatenated gzip members are read one after another.
+    """
+
+    def __init__(self):
+        self._decompressor = zlib.decompressobj(31)
+
+    def feed(self, data: bytes) -> Iterator[bytes]:
+        while data:
+            if self._decompressor.eof:
+                self._decompressor = zlib.decompressobj(31)
+            block = self._decompressor.decompress(data, CHUNK_BYTES)
+            if self._decompressor.eof:
+                data = self._decompressor.unused_data
+            else:
+                data = self._decompressor.unconsumed_tail
+            if block:
+                yield block
+
+    @property
+    def complete(self) -> bool:
+        return self._decompressor.eof
+
+
+async def ndjson_lines(chunks: AsyncIterator[bytes], gzipped: bool = False) -> AsyncIterator[Tuple[int, bytes]]:
+    """(line number, line) for each non-blank line of a streamed NDJSON body.
+
+    Gzip is decompressed on the fly, when flagged by the caller or
+    recognized by its magic bytes; a body cut off mid-stream is rejected.
+    Only one line is buffered at a time; a line longer than MAX_LINE_BYTES
+    is rejected.
+    """
+    inflater = None
+    started = False
+    pending = b''
+    number = 0
+    async for chunk in chunks:
+        if not started and chunk:
+            started = True
+            if gzipped or chunk.startswith(GZIP_MAGIC):
+                inflater = Inflater()
+        blocks = inflater.feed(chunk) if inflater is not None else iter((chunk,))
+        while True:
+            try:
+                block = next(blocks, None)
+            except zlib.error as e:
+                raise RecipeImportError(number + 1, f"invalid gzip data ({e})")
+            if block is None:
+                break
+            pending += block
+            *lines, pending = pending.split(b'\n')
+            for line in lines:
+                number += 1
+                if line.strip():
+                    yield number, line
+            if len(pending) > MAX_LINE_BYTES:
+                raise RecipeImportError(number + 1, f"line longer than {MAX_LINE_BYTES} bytes")
+    if inflater is not None and not inflater.complete:
+        raise RecipeImportError(number + 1, "gzip data ends before the end of the stream")
+    if pending.strip():
+        yield number + 1, pending
+
+
+def parse_recipe(number: int, line: bytes) -> schemas.RecipeImport:
+    try:
+        return schemas.RecipeImport.model_validate(json.loads(line))
+    except (ValueError, ValidationError) as e:
+        raise RecipeImportError(number, str(e))
+
+
+class RecipeImporter:
+    """Writes recipes in chunked transactions of IMPORT_BATCH_SIZE.
+
+    Ingredients given by value are matched on their normalized name through
+    the in-process name index (ids differ between environments) and created
+    once if missing; ingredients given by id are checked with one query per
+    chunk. Each chunk's recipes are inserted with one multi-row statement,
+    their ingredient rows with another, their nutrition is rolled up in the
+    same transaction, and the session is cleared after the commit, so
+    memory stays flat however long the stream is.
+
+    `add` only queues; `flush` and `write` do blocking database work, so
+    async callers run them in a worker thread.
+    """
+
+    def __init__(self, db: Session, batch_size: int = IMPORT_BATCH_SIZE):
+        self.db = db
+        self.batch_size = batch_size
+        self.pending: List[Tuple[int, schemas.RecipeImport]] = []
+        self.imported = 0
+        self.created_ingredients = 0
+
+    def add(self, number: int, recipe: schemas.RecipeImport) -> bool:
+        """Queue a recipe; True once a full chunk is waiting for `flush`."""
+        self.pending.append((number, recipe))
+        return len(self.pending) >= self.batch_size
+
+    def flush(self) -> List[int]:
+        batch, self.pending = self.pending, []
+        return self.write(batch)
+
+    def write(self, batch: Sequence[Tuple[int, schemas.RecipeImport]]) -> List[int]:
+        """Insert one chunk in one transaction; the new recipe ids, in order."""
+        if not batch:
+            return []
+        try:
+            ingredient_ids, created = self._resolve_ingredients(batch)
+            recipes = [models.Recipe(**recipe.model_dump(exclude={'ingredients'})) for _, recipe in batch]
+            self.db.add_all(recipes)
+            self.db.flush()
+            rows = [
+                {
+                    'recipe_id': db_recipe.id,
+                    'ingredient_id': ingredient_id,
+                    'quantity': item.quantity,
+                    'unit': item.unit,
+                }
+                for db_recipe, (_, recipe), ids in zip(recipes, batch, ingredient_ids)
+                for item, ingredient_id in zip(recipe.ingredients, ids)
+            ]
+            if rows:
+                self.db.execute(insert(models.RecipeIngredient), rows)
+            recipe_ids = [db_recipe.id for db_recipe in recipes]
+            refresh_recipe_nutrition(self.db, recipe_ids)
+            self.db.commit()
+        except Exception:
+            self.db.rollback()
+            raise
+        finally:
+            self.db.expunge_all()
+
+        for ingredient_id, name in created:
+            ingredient_autocomplete.add(ingredient_id, name)
+        self.imported += len(recipe_ids)
+        self.created_ingredients += len(created)
+        return recipe_ids
+
+    def _resolve_ingredients(
+        self,
+        batch: Sequence[Tuple[int, schemas.RecipeImport]]
+    ) -> Tuple[List[List[int]], List[Tuple[int, str]]]:
+        ingredient_autocomplete.ensure_loaded(self.db)
+        by_name: Dict[str, Optional[int]] = {}
+        given: Dict[str, schemas.IngredientCreate] = {}
+        wanted_ids = set()
+        for number, recipe in batch:
+            for item in recipe.ingredients:
+                if item.ingredient is not None:
+                    key = normalize_name(item.ingredient.name)
+                    if key not in by_name:
+                        by_name[key] = ingredient_autocomplete.find(key)
+                        given[key] = item.ingredient
+                elif item.ingredient_id is not None:
+                    wanted_ids.add(item.ingredient_id)
+                else:
+                    raise RecipeImportError(number, "each ingredient needs an ingredient_id or an ingredient")
+
+        known_ids = set()
+        if wanted_ids:
+            known_ids = {
+                ingredient_id for (ingredient_id,) in
+                self.db.query(models.Ingredient.id).filter(models.Ingredient.id.in_(wanted_ids))
+            }
+
+        # Names another process may have added since the index was loaded
+        missing = [key for key, ingredient_id in by_name.items() if ingredient_id is None]
+        if missing:
+            names = {given[key].name for key in missing}
+            for ingredient_id, name in self.db.query(models.Ingredient.id, models.Ingredient.name).filter(
+                models.Ingredient.name.in_(names)
+            ):
+                by_name[normalize_name(name)] = ingredient_id
+
+        new_ingredients = {
+            key: models.Ingredient(**given[key].model_dump())
+            for key, ingredient_id in by_name.items() if ingredient_id is None
+        }
+        if new_ingredients:
+            self.db.add_all(new_ingredients.values())
+            self.db.flush()
+            for key, ingredient in new_ingredients.items():
+                by_name[key] = ingredient.id
+
+        resolved = []
+        for number, recipe in batch:
+            ids = []
+            for item in recipe.ingredients:
+                if item.ingredient is not None:
+                    ingredient_id = by_name[normalize_name(item.ingredient.name)]
+                elif item.ingredient_id in known_ids:
+                    ingredient_id = item.ingredient_id
+                else:
+                    raise RecipeImportError(number, f"unknown ingredient_id {item.ingredient_id}")
+                # (recipe_id, ingredient_id) is the primary key of recipe_ingredients
+                if ingredient_id in ids:
+                    raise RecipeImportError(number, f"ingredient {ingredient_id} is listed more than once")
+                ids.append(ingredient_id)
+            resolved.append(ids)
+        created = [(ingredient.id, ingredient.name) for ingredient in new_ingredients.values()]
+        return resolved, created
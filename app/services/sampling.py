@@ -0,0 +1,184 @@
+from bisect import bisect_left, bisect_right
+from itertools import accumulate
+from typing import Dict, List, Optional, Sequence, Set, Tuple
+from .calorie_index import MEAL_TYPES, CalorieIndex
+from .recipe_catalog import CatalogSnapshot, RecipeRecord
+
+# Width (kcal) of the calorie buckets each meal type's candidates are cut into
+CALORIE_BUCKET = 10
+REJECTION_TRIES = 8
+
+
+class AliasTable:
+    """Walker alias table (Vose's construction) for O(1) weighted draws."""
+
+    __slots__ = ('size', 'prob', 'alias')
+
+    def __init__(self, weights: Sequence[float]):
+        size = len(weights)
+        total = float(sum(weights))
+        scaled = [w * size / total for w in weights]
+        prob = [1.0] * size
+        alias = list(range(size))
+        small = [i for i, p in enumerate(scaled) if p < 1.0]
+        large = [i for i, p in enumerate(scaled) if p >= 1.0]
+        while small and large:
+            s = small.pop()
+            l = large.pop()
+            prob[s] = scaled[s]
+            alias[s] = l
+            scaled[l] = scaled[l] + scaled[s] - 1.0
+            if scaled[l] < 1.0:
+                small.append(l)
+            else:
+                large.append(l)
+        # Whatever is left over is 1.0 up to rounding error
+        self.size = size
+        self.prob = prob
+        self.alias = alias
+
+    def draw(self, rng) -> int:
+        # One uniform: the integer part picks a column, the fraction decides
+        # between the column and its alias.
+        u = rng.random() * self.size
+        i = int(u)
+        if i == self.size:
+            i -= 1
+        return i if u - i < self.prob[i] else self.alias[i]
+
+
+class BucketTables:
+    """One meal type's candidates cut into fixed-width calorie buckets.
+
+    Each bucket is a contiguous run of the calorie index with its own alias
+    table; prefix sums over bucket weights pick the bucket for a window.
+    Everything here is immutable and shared by all generator runs on the
+    same catalog snapshot and dietary filter.
+    """
+
+    def __init__(self, index: CalorieIndex):
+        self.index = index
+        self.keys: List[int] = []
+        self.bounds: List[Tuple[int, int]] = []
+        self.tables: List[AliasTable] = []
+        self.totals: List[float] = []
+        start = 0
+        calories = index.calories
+        while start < len(calories):
+            key = int(calories[start] // CALORIE_BUCKET)
+            end = bisect_left(calories, (key + 1) * CALORIE_BUCKET, start)
+            weights = index.weights[start:end]
+            self.keys.append(key)
+            self.bounds.append((start, end))
+            self.tables.append(AliasTable(weights))
+            self.totals.append(float(sum(weights)))
+            start = end
+        self.bucket_of: List[int] = [0] * len(calories)
+        for bucket, (start, end) in enumerate(self.bounds):
+            self.bucket_of[start:end] = [bucket] * (end - start)
+        self.cum_totals: List[float] = list(accumulate(self.totals))
+
+    @classmethod
+    def for_snapshot(cls, snapshot: CatalogSnapshot, dietary_preferences: Sequence[str]) -> Dict[str, 'BucketTables']:
+        key = ('bucket_tables', tuple(sorted(set(dietary_preferences))))
+
+        def build(snap: CatalogSnapshot) -> Dict[str, 'BucketTables']:
+            indexes = CalorieIndex.for_snapshot(snap, dietary_preferences)
+            return {meal_type: cls(indexes[meal_type]) for meal_type in MEAL_TYPES}
+
+        return snapshot.derived(key, build)
+
+    def window(self, min_calories: float, max_calories: float) -> Tuple[int, int]:
+        """Buckets overlapping [min_calories, max_calories]."""
+        first = bisect_left(self.keys, int(min_calories // CALORIE_BUCKET))
+        last = bisect_right(self.keys, int(max_calories // CALORIE_BUCKET))
+        return first, last
+
+
+class RecipeSampler:
+    """Per-run weighted sampler over one meal type's bucket tables.
+
+    A draw picks a bucket by prefix-sum search and a recipe from that
+    bucket's alias table, rejecting recipes outside the exact calorie
+    window, removed for hitting the usage cap, or excluded for the day.
+    When half of a bucket has been removed, this run gets a private table
+    for it, so rejections stay rare without touching the shared tables.
+    """
+
+    def __init__(self, tables: BucketTables, rng):
+        self.tables = tables
+        self.index = tables.index
+        self.rng = rng
+        self.removed: Set[int] = set()
+        # Removals since the bucket's current table was built, per bucket
+        self._stale: Dict[int, int] = {}
+        self._private: Dict[int, Tuple[List[int], Optional[AliasTable]]] = {}
+        self._totals: Optional[List[float]] = None
+        self._cum_totals = tables.cum_totals
+
+    def remove(self, recipe_id: int) -> None:
+        position = self.index.position_of.get(recipe_id)
+        if position is None or position in self.removed:
+            return
+        self.removed.add(position)
+
+        bucket = self.tables.bucket_of[position]
+        stale = self._stale.get(bucket, 0) + 1
+        self._stale[bucket] = stale
+        if bucket in self._private:
+            size = len(self._private[bucket][0])
+        else:
+            start, end = self.tables.bounds[bucket]
+            size = end - start
+        if stale * 2 >= size:
+            self._rebuild_bucket(bucket)
+
+    def _rebuild_bucket(self, bucket: int) -> None:
+        start, end = self.tables.bounds[bucket]
+        live = [p for p in range(start, end) if p not in self.removed]
+        weights = [self.index.weights[p] for p in live]
+        self._private[bucket] = (live, AliasTable(weights) if live else None)
+        self._stale[bucket] = 0
+
+        if self._totals is None:
+            self._totals = list(self.tables.totals)
+        self._totals[bucket] = float(sum(weights))
+        self._cum_totals = list(accumulate(self._totals))
+
+    def draw(self, target_calories: float, max_deviation: float, exclude_ids: Set[int]) -> Optional[RecipeRecord]:
+        min_calories = target_calories * (1 - max_deviation)
+        max_calories = target_calories * (1 + max_deviation)
+        first, last = self.tables.window(min_calories, max_calories)
+        if first >= last:
+            return None
+
+        cum = self._cum_totals
+        base = cum[first - 1] if first > 0 else 0.0
+        span = cum[last - 1] - base
+        records = self.index.records
+        if span > 0:
+            for _ in range(REJECTION_TRIES):
+                bucket = min(bisect_right(cum, base + self.rng.random() * span, first, last), last - 1)
+                private = self._private.get(bucket)
+                if private is None:
+                    position = self.tables.bounds[bucket][0] + self.tables.tables[bucket].draw(self.rng)
+                elif private[1] is None:
+                    continue
+                else:
+                    position = private[0][private[1].draw(self.rng)]
+                recipe = records[position]
+                if (position not in self.removed
+                        and min_calories <= recipe.calories <= max_calories
+                        and recipe.id not in exclude_ids):
+                    return recipe
+
+        # Rejections kept failing: draw exactly from what is left in the window
+        lo, hi = self.index.window(min_calories, max_calories)
+        candidates = [
+            p for p in range(lo, hi)
+            if p not in self.removed and records[p].id not in exclude_ids
+        ]
+        if not candidates:
+            return None
+        weights = [self.index.weights[p] for p in candidates]
+        return records[self.rng.choices(candidates, weights=weights, k=1)[0]]
@@ -0,0 +1,175 @@
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Tuple
+from sqlalchemy import Float, cast, func, insert, select, update
+from sqlalchemy.orm import Session
+from .. import models
+from .plan_hash import refresh_entries_hash
+from .units import IngredientTotal, fold_quantities
+
+
+def ingredient_totals(db: Session, *criteria) -> List[IngredientTotal]:
+    """Consolidated ingredient quantities for the meal plan entries matching `criteria`.
+
+    One grouped query: each entry contributes its recipe's ingredient
+    quantities scaled by entry servings / recipe servings, summed per
+    (ingredient, unit) as written in recipes. Those sums are then folded
+    into each ingredient's canonical unit (see `units`).
+    """
+    multiplier = cast(func.coalesce(models.MealPlanEntry.servings, 1), Float) / models.Recipe.servings
+    query = (
+        select(
+            models.RecipeIngredient.ingredient_id,
+            models.RecipeIngredient.unit,
+            models.Ingredient.category,
+            func.sum(models.RecipeIngredient.quantity * multiplier).label('quantity'),
+            models.Ingredient.base_unit,
+            models.Ingredient.density,
+            models.Ingredient.piece_weight,
+        )
+        .select_from(models.MealPlanEntry)
+        .join(models.Recipe, models.Recipe.id == models.MealPlanEntry.recipe_id)
+        .join(models.RecipeIngredient, models.RecipeIngredient.recipe_id == models.Recipe.id)
+        .join(models.Ingredient, models.Ingredient.id == models.RecipeIngredient.ingredient_id)
+        .where(*criteria)
+        .group_by(
+            models.RecipeIngredient.ingredient_id,
+            models.RecipeIngredient.unit,
+            models.Ingredient.category,
+            models.Ingredient.base_unit,
+            models.Ingredient.density,
+            models.Ingredient.piece_weight,
+        )
+        .order_by(models.RecipeIngredient.ingredient_id, models.RecipeIngredient.unit)
+    )
+    return fold_quantities(db.execute(query))
+
+
+# Quantities at or below this are treated as used up
+QUANTITY_EPSILON = 1e-9
+
+IngredientKey = Tuple[int, str]
+
+
+def totals_by_key(rows: Iterable) -> Dict[IngredientKey, Tuple[float, Optional[str]]]:
+    return {(row.ingredient_id, row.unit): (row.quantity or 0.0, row.category) for row in rows}
+
+
+def ingredient_deltas(before: Iterable, after: Iterable) -> Dict[IngredientKey, Tuple[float, Optional[str]]]:
+    """Per-(ingredient, unit) change between two `ingredient_totals` results."""
+    old = totals_by_key(before)
+    new = totals_by_key(after)
+    deltas = {}
+    for key in old.keys() | new.keys():
+        old_quantity, old_category = old.get(key, (0.0, None))
+        new_quantity, new_category = new.get(key, (0.0, None))
+        delta = new_quantity - old_quantity
+        if abs(delta) > QUANTITY_EPSILON:
+            deltas[key] = (delta, new_category or old_category)
+    return deltas
+
+
+def apply_deltas(db: Session, meal_plan_id: int, deltas: Dict[IngredientKey, Tuple[float, Optional[str]]]) -> None:
+    """Add `deltas` to every shopping list of the meal plan, in the current transaction.
+
+    Only items of the changed (ingredient, unit) pairs are touched. Items
+    that run out are deleted, items that grow go back to pending, and new
+    pairs are inserted as pending. Each list's version is bumped.
+    """
+    if not deltas:
+        return
+    list_ids = db.scalars(
+        select(models.ShoppingList.id).where(models.ShoppingList.meal_plan_id == meal_plan_id)
+    ).all()
+    if not list_ids:
+        return
+
+    items = db.scalars(
+        select(models.ShoppingListItem).where(
+            models.ShoppingListItem.shopping_list_id.in_(list_ids),
+            models.ShoppingListItem.ingredient_id.in_({ingredient_id for ingredient_id, _ in deltas}),
+        )
+    ).all()
+    existing = {(item.shopping_list_id, item.ingredient_id, item.unit): item for item in items}
+
+    new_rows = []
+    for list_id in list_ids:
+        for (ingredient_id, unit), (delta, category) in deltas.items():
+            item = existing.get((list_id, ingredient_id, unit))
+            if item is None:
+                if delta > 0:
+                    new_rows.append({
+                        'shopping_list_id': list_id,
+                        'ingredient_id': ingredient_id,
+                        'quantity': delta,
+                        'unit': unit,
+                        'category': category,
+                        'status': 'pending',
+                    })
+                continue
+            item.quantity = (item.quantity or 0.0) + delta
+            if item.quantity <= QUANTITY_EPSILON:
+                db.delete(item)
+            elif delta > 0:
+                item.status = 'pending'
+    if new_rows:
+        db.execute(insert(models.ShoppingListItem), new_rows)
+    db.execute(
+        update(models.ShoppingList)
+        .where(models.ShoppingList.id.in_(list_ids))
+        .values(version=models.ShoppingList.version + 1)
+    )
+
+
+def update_shopping_lists(db: Session, meal_plan: models.MealPlan, before: Iterable, *criteria) -> None:
+    """Bring a plan's entries hash and shopping lists up to date after an entry edit.
+
+    Call after flushing the edit; `before` is `ingredient_totals(db, *criteria)`
+    taken before it, over the entries the edit touched.
+    """
+    previous_hash = meal_plan.entries_hash
+    current_hash = refresh_entries_hash(db, meal_plan.id)
+    apply_deltas(db, meal_plan.id, ingredient_deltas(before, ingredient_totals(db, *criteria)))
+    if previous_hash is not None:
+        # Lists that reflected the old entries reflect the new ones now
+        db.execute(
+            update(models.ShoppingList)
+            .where(
+                models.ShoppingList.meal_plan_id == meal_plan.id,
+                models.ShoppingList.source_version == previous_hash
+            )
+            .values(source_version=current_hash)
+        )
+
+
+def refresh_ingredient_lists(db: Session, ingredient_id: int, category: Optional[str]) -> None:
+    """After an ingredient is renamed or recategorized, update the lists that contain it.
+
+    Items carry the ingredient's category onward, and each list's version is
+    bumped: exports are cached by version and ETags are built from it, so
+    neither keeps serving the old name or grouping.
+    """
+    db.execute(
+        update(models.ShoppingList)
+        .where(models.ShoppingList.id.in_(
+            select(models.ShoppingListItem.shopping_list_id)
+            .where(models.ShoppingListItem.ingredient_id == ingredient_id)
+        ))
+        .values(version=models.ShoppingList.version + 1)
+        .execution_options(synchronize_session=False)
+    )
+    db.execute(
+        update(models.ShoppingListItem)
+        .where(models.ShoppingListItem.ingredient_id == ingredient_id)
+        .values(category=category)
+        .execution_options(synchronize_session=False)
+    )
+
+
+def household_entries(user_id: int, start_date: datetime, end_date: datetime) -> tuple:
+    """Criteria for every entry of a user's plans dated within [start_date, end_date]."""
+    user_plans = select(models.MealPlan.id).where(models.MealPlan.user_id == user_id)
+    return (
+        models.MealPlanEntry.meal_plan_id.in_(user_plans),
+        models.MealPlanEntry.date >= start_date,
+        models.MealPlanEntry.date <= end_date,
+    )
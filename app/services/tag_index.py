@@ -0,0 +1,108 @@
+from typing import Dict, List, Optional, Sequence
+import numpy as np
+from sqlalchemy import and_, exists, func, select, type_coerce
+from sqlalchemy.dialects.postgresql import JSONB
+from sqlalchemy.orm import Query
+from .. import models
+from .recipe_catalog import CatalogSnapshot, RecipeRecord, recipe_catalog
+
+WORD_BITS = 64
+WORD_MASK = (1 << WORD_BITS) - 1
+# Largest id list bound as an IN filter; SQLite allows 999 variables per
+# statement in older builds, shared with the rest of the query
+MAX_BOUND_IDS = 500
+
+
+class TagIndex:
+    """Interned dietary tags with a bitmask per recipe record.
+
+    Every distinct tag gets one bit; a recipe's mask is the OR of its tags'
+    bits, stored as rows of 64-bit words so the catalog can grow past 64
+    tags. A preference filter is a single vectorized AND over that array.
+    """
+
+    def __init__(self, records: Sequence[RecipeRecord]):
+        self.records = list(records)
+        self.bits: Dict[str, int] = {}
+        packed = []
+        for record in self.records:
+            mask = 0
+            for tag in record.dietary_tags:
+                bit = self.bits.get(tag)
+                if bit is None:
+                    bit = self.bits[tag] = len(self.bits)
+                mask |= 1 << bit
+            packed.append(mask)
+
+        words = max(1, -(-len(self.bits) // WORD_BITS))
+        self.masks = np.empty((len(self.records), words), dtype=np.uint64)
+        for word in range(words):
+            shift = word * WORD_BITS
+            self.masks[:, word] = np.fromiter(
+                ((mask >> shift) & WORD_MASK for mask in packed),
+                dtype=np.uint64,
+                count=len(packed)
+            )
+
+    @classmethod
+    def for_snapshot(cls, snapshot: CatalogSnapshot) -> 'TagIndex':
+        return snapshot.derived('tag_index', lambda snap: cls(snap.records))
+
+    def mask_for(self, tags: Sequence[str]) -> Optional[np.ndarray]:
+        """Query mask for the given tags, or None if any tag is unknown."""
+        mask = np.zeros(self.masks.shape[1], dtype=np.uint64)
+        for tag in tags:
+            bit = self.bits.get(tag)
+            if bit is None:
+                return None
+            mask[bit // WORD_BITS] |= np.uint64(1 << (bit % WORD_BITS))
+        return mask
+
+    def positions(self, tags: Sequence[str]) -> np.ndarray:
+        """Positions of records carrying every tag in `tags`."""
+        if not tags:
+            return np.arange(len(self.records))
+        mask = self.mask_for(tags)
+        if mask is None:
+            return np.empty(0, dtype=np.int64)
+        return np.flatnonzero(((self.masks & mask) == mask).all(axis=1))
+
+    def ids(self, tags: Sequence[str]) -> List[int]:
+        return [self.records[i].id for i in self.positions(tags)]
+
+
+def matching_records(snapshot: CatalogSnapshot, dietary_preferences: Sequence[str]) -> List[RecipeRecord]:
+    """Snapshot records matching every dietary preference, cached per tag set."""
+    prefs = frozenset(dietary_preferences)
+    if not prefs:
+        return snapshot.records
+
+    def build(snap: CatalogSnapshot) -> List[RecipeRecord]:
+        index = TagIndex.for_snapshot(snap)
+        return [index.records[i] for i in index.positions(sorted(prefs))]
+
+    return snapshot.derived(('matching', prefs), build)
+
+
+def filter_by_tags(db_query: Query, tags: Sequence[str]) -> Optional[Query]:
+    """Restrict a recipe query to recipes carrying every tag; None if none can match.
+
+    PostgreSQL answers `dietary_tags @> '[...]'` from the GIN index on the
+    JSONB column. Elsewhere the tag bitmasks of the in-memory catalog
+    resolve the matching ids; when there are more than MAX_BOUND_IDS of
+    them, each tag is checked against the JSON array with json_each instead.
+    """
+    tags = sorted(set(tags))
+    if db_query.session.get_bind().dialect.name == 'postgresql':
+        return db_query.filter(type_coerce(models.Recipe.dietary_tags, JSONB).contains(tags))
+    ids = TagIndex.for_snapshot(recipe_catalog.snapshot(db_query.session)).ids(tags)
+    if not ids:
+        return None
+    if len(ids) <= MAX_BOUND_IDS:
+        return db_query.filter(models.Recipe.id.in_(ids))
+    return db_query.filter(and_(*(_has_tag(tag) for tag in tags)))
+
+
+def _has_tag(tag: str):
+    elements = func.json_each(models.Recipe.dietary_tags).table_valued('value')
+    return exists(select(1).select_from(elements).where(elements.c.value == tag))
@@ -0,0 +1,111 @@
+from functools import lru_cache
+from typing import Dict, Iterable, List, NamedTuple, Optional, Tuple
+import numpy as np
+
+# Known spellings -> (dimension, factor to the dimension's base unit)
+UNITS: Dict[str, Tuple[str, float]] = {
+    **dict.fromkeys(('g', 'gr', 'gram', 'grams', 'г', 'гр', 'грам'), ('mass', 1.0)),
+    **dict.fromkeys(('kg', 'кг'), ('mass', 1000.0)),
+    **dict.fromkeys(('mg', 'мг'), ('mass', 0.001)),
+    'oz': ('mass', 28.349523125),
+    'lb': ('mass', 453.59237),
+    **dict.fromkeys(('ml', 'мл'), ('volume', 1.0)),
+    **dict.fromkeys(('l', 'л'), ('volume', 1000.0)),
+    **dict.fromkeys(('tsp', 'ч.л'), ('volume', 5.0)),
+    **dict.fromkeys(('tbsp', 'ст.л'), ('volume', 15.0)),
+    **dict.fromkeys(('cup', 'склянка'), ('volume', 250.0)),
+    **dict.fromkeys(('unit', 'units', 'pc', 'pcs', 'piece', 'pieces', 'шт'), ('count', 1.0)),
+}
+# What quantities fold into when the ingredient's base unit can't take them
+DIMENSION_UNITS = {'mass': 'g', 'volume': 'ml', 'count': 'unit'}
+
+
+class IngredientTotal(NamedTuple):
+    ingredient_id: int
+    unit: str
+    category: Optional[str]
+    quantity: float
+
+
+def normalize_unit(unit: Optional[str]) -> str:
+    """'Ст.л. ' -> 'ст.л': trimmed, case-folded, without a trailing dot."""
+    return ' '.join((unit or '').split()).casefold().rstrip('.')
+
+
+@lru_cache(maxsize=None)
+def parse_unit(unit: Optional[str]) -> Optional[Tuple[str, float]]:
+    return UNITS.get(normalize_unit(unit))
+
+
+class UnitConversions:
+    """Conversion factors from recipe units to one ingredient's canonical unit.
+
+    The canonical unit is the ingredient's base_unit. Mass and volume are
+    bridged by density (g per ml), mass and pieces by piece weight (g per
+    piece). Units that can't reach the base unit fold into their own
+    dimension's unit; unknown units are kept as written.
+    """
+
+    def __init__(self, base_unit: Optional[str], density: Optional[float] = None, piece_weight: Optional[float] = None):
+        self.base = parse_unit(base_unit)
+        self.unit = (base_unit or '').strip()
+        # Grams in one base unit of each dimension, where known
+        self.grams = {'mass': 1.0, 'volume': density or None, 'count': piece_weight or None}
+        self._factors: Dict[str, Tuple[str, float]] = {}
+
+    def convert(self, unit: Optional[str]) -> Tuple[str, float]:
+        """(target unit, factor) so that quantity * factor is in the target unit."""
+        converted = self._factors.get(unit)
+        if converted is None:
+            converted = self._factors[unit] = self._compile(unit)
+        return converted
+
+    def _compile(self, unit: Optional[str]) -> Tuple[str, float]:
+        parsed = parse_unit(unit)
+        if parsed is None:
+            return (unit or '').strip(), 1.0
+        dimension, factor = parsed
+        if self.base is not None:
+            base_dimension, base_factor = self.base
+            if dimension == base_dimension:
+                return self.unit, factor / base_factor
+            grams, base_grams = self.grams[dimension], self.grams[base_dimension]
+            if grams and base_grams:
+                return self.unit, factor * grams / (base_factor * base_grams)
+        return DIMENSION_UNITS[dimension], factor
+
+
+@lru_cache(maxsize=4096)
+def conversions_for(base_unit: Optional[str], density: Optional[float], piece_weight: Optional[float]) -> UnitConversions:
+    # Ingredients with the same base unit and weights share one table
+    return UnitConversions(base_unit, density, piece_weight)
+
+
+def fold_quantities(rows: Iterable) -> List[IngredientTotal]:
+    """Fold per-(ingredient, unit) quantities into each ingredient's canonical unit.
+
+    Rows carry ingredient_id, unit, category, quantity, base_unit, density
+    and piece_weight. Factors come from the cached conversion tables; the
+    scaling and summing is one vectorized pass.
+    """
+    rows = list(rows)
+    if not rows:
+        return []
+    slots: Dict[Tuple[int, str], int] = {}
+    categories: List[Optional[str]] = []
+    inverse = np.empty(len(rows), dtype=np.intp)
+    factors = np.empty(len(rows), dtype=np.float64)
+    for i, row in enumerate(rows):
+        unit, factor = conversions_for(row.base_unit, row.density, row.piece_weight).convert(row.unit)
+        slot = slots.setdefault((row.ingredient_id, unit), len(slots))
+        if slot == len(categories):
+            categories.append(row.category)
+        inverse[i] = slot
+        factors[i] = factor
+
+    quantities = np.fromiter((row.quantity or 0.0 for row in rows), dtype=np.float64, count=len(rows))
+    totals = np.bincount(inverse, weights=quantities * factors, minlength=len(slots))
+    return [
+        IngredientTotal(ingredient_id, unit, categories[slot], float(totals[slot]))
+        for (ingredient_id, unit), slot in slots.items()
+    ]
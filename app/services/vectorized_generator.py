@@ -0,0 +1,207 @@
+from typing import Dict, List, Optional, Sequence
+import numpy as np
+from .recipe_catalog import CatalogSnapshot, RecipeRecord
+from .nutrient_index import macro_ratios, nutrient_scale
+from .tag_index import matching_records
+
+# (meal type, share of the daily target, allowed deviation); dinner takes
+# whatever is left of the daily target after breakfast and lunch.
+FIXED_SLOTS = (('breakfast', 0.25, 0.2), ('lunch', 0.35, 0.2))
+DINNER_DEVIATION = 0.25
+MAX_USES = 2
+# Scalar redraws attempted before falling back to an exact masked draw
+REJECTION_TRIES = 8
+
+
+class MealSlotColumns:
+    """Candidates for one meal type (weight > 0), sorted by calories."""
+
+    def __init__(self, positions: np.ndarray, nutrients: np.ndarray, weights: np.ndarray):
+        calories = nutrients[:, 0]
+        order = np.argsort(calories[positions], kind='stable')
+        self.positions = positions[order]
+        self.calories = calories[self.positions]
+        self.weights = weights[self.positions]
+        self.cum_weights = np.cumsum(self.weights)
+        # Normalized (calories, protein, carbs, fats) for the fallback search
+        matrix = nutrients[self.positions]
+        self.scale = nutrient_scale(matrix)
+        self.ratios = macro_ratios(matrix)
+        self.nutrients = matrix / self.scale
+
+    def target_point(self, target: float) -> np.ndarray:
+        return np.concatenate(([target], self.ratios * target)) / self.scale
+
+    def __len__(self) -> int:
+        return len(self.positions)
+
+    def window(self, target: np.ndarray, deviation: float):
+        lo = np.searchsorted(self.calories, target * (1 - deviation), side='left')
+        hi = np.searchsorted(self.calories, target * (1 + deviation), side='right')
+        return lo, hi
+
+    def draw(self, lo: np.ndarray, hi: np.ndarray, u: np.ndarray) -> np.ndarray:
+        """Weighted draw inside [lo, hi) for every row at once; -1 where the window is empty."""
+        empty = hi <= lo
+        lo_safe = np.where(empty, 0, lo)
+        hi_safe = np.where(empty, 1, hi)
+        cum = self.cum_weights
+        base = np.where(lo_safe > 0, cum[lo_safe - 1], 0.0)
+        span = cum[hi_safe - 1] - base
+        picked = np.searchsorted(cum, base + u * span, side='right')
+        picked = np.clip(picked, lo_safe, hi_safe - 1)
+        return np.where(empty, -1, picked)
+
+
+class RecipeColumns:
+    """Columnar arrays over a list of recipe records."""
+
+    def __init__(self, records: Sequence[RecipeRecord]):
+        self.records = list(records)
+        self.ids = np.fromiter((r.id for r in self.records), dtype=np.int64, count=len(self.records))
+        self.calories = np.fromiter((r.calories for r in self.records), dtype=np.float64, count=len(self.records))
+        self.protein = np.fromiter((r.protein for r in self.records), dtype=np.float64, count=len(self.records))
+        self.carbs = np.fromiter((r.carbs for r in self.records), dtype=np.float64, count=len(self.records))
+        self.fats = np.fromiter((r.fats for r in self.records), dtype=np.float64, count=len(self.records))
+        nutrients = np.column_stack((self.calories, self.protein, self.carbs, self.fats))
+        self.slots: Dict[str, MealSlotColumns] = {}
+        for meal_type in ('breakfast', 'lunch', 'dinner'):
+            weights = np.fromiter(
+                (getattr(r, f'{meal_type}_weight') for r in self.records),
+                dtype=np.float64,
+                count=len(self.records),
+            )
+            self.slots[meal_type] = MealSlotColumns(np.flatnonzero(weights > 0), nutrients, weights)
+
+    @classmethod
+    def for_snapshot(cls, snapshot: CatalogSnapshot, dietary_preferences: Sequence[str]) -> 'RecipeColumns':
+        key = ('columns', tuple(sorted(set(dietary_preferences))))
+
+        return snapshot.derived(key, lambda snap: cls(matching_records(snap, dietary_preferences)))
+
+
+class VectorizedMealPlanEngine:
+    """Plans every day of a meal plan with batched NumPy draws.
+
+    Breakfast and lunch proposals for all days are drawn in one call each,
+    dinner windows are derived from those proposals and drawn in a third
+    call. A single pass over the days then enforces the usage cap and the
+    no-repeat-within-a-day rule, redrawing only the slots that conflict.
+    """
+
+    def __init__(self, columns: RecipeColumns, rng: Optional[np.random.Generator] = None, max_uses: int = MAX_USES):
+        self.columns = columns
+        self.rng = rng if rng is not None else np.random.default_rng()
+        self.max_uses = max_uses
+        self.uses = np.zeros(len(columns.records), dtype=np.int64)
+
+    def plan(self, days: int, target_calories: float) -> List[Dict[str, RecipeRecord]]:
+        slots = self.columns.slots
+        for meal_type, slot in slots.items():
+            if not len(slot):
+                raise ValueError(f"No recipes available for {meal_type}")
+
+        proposals = {}
+        windows = {}
+        for meal_type, share, deviation in FIXED_SLOTS:
+            slot = slots[meal_type]
+            lo, hi = slot.window(np.full(days, target_calories * share), deviation)
+            windows[meal_type] = (lo, hi)
+            proposals[meal_type] = slot.draw(lo, hi, self.rng.random(days))
+
+        dinner = slots['dinner']
+        dinner_targets = target_calories - self._proposal_calories('breakfast', proposals) \
+            - self._proposal_calories('lunch', proposals)
+        dinner_lo, dinner_hi = dinner.window(dinner_targets, DINNER_DEVIATION)
+        dinner_proposals = dinner.draw(dinner_lo, dinner_hi, self.rng.random(days))
+
+        plan = []
+        records = self.columns.records
+        for day in range(days):
+            chosen: List[int] = []
+            changed = False
+            for meal_type, share, deviation in FIXED_SLOTS:
+                slot = slots[meal_type]
+                lo, hi = windows[meal_type]
+                proposed = int(proposals[meal_type][day])
+                position = self._resolve(
+                    slot, int(lo[day]), int(hi[day]), proposed, target_calories * share, chosen
+                )
+                changed = changed or position != self._position(slot, proposed)
+                chosen.append(position)
+
+            if changed:
+                # Breakfast or lunch were redrawn, so this day's dinner window moved
+                target = target_calories - self.columns.calories[chosen].sum()
+                lo, hi = dinner.window(np.array([target]), DINNER_DEVIATION)
+                lo, hi = int(lo[0]), int(hi[0])
+                proposed = int(dinner.draw(np.array([lo]), np.array([hi]), self.rng.random(1))[0])
+            else:
+                target = float(dinner_targets[day])
+                lo, hi = int(dinner_lo[day]), int(dinner_hi[day])
+                proposed = int(dinner_proposals[day])
+            chosen.append(self._resolve(dinner, lo, hi, proposed, target, chosen))
+
+            plan.append({
+                'breakfast': records[chosen[0]],
+                'lunch': records[chosen[1]],
+                'dinner': records[chosen[2]],
+            })
+        return plan
+
+    def _proposal_calories(self, meal_type: str, proposals: Dict[str, np.ndarray]) -> np.ndarray:
+        slot = self.columns.slots[meal_type]
+        drawn = proposals[meal_type]
+        # Empty windows fall back to the nearest recipe, which is only known
+        # after the sequential pass; NaN marks those days for a dinner redraw.
+        return np.where(drawn >= 0, slot.calories[np.maximum(drawn, 0)], np.nan)
+
+    @staticmethod
+    def _position(slot: MealSlotColumns, index: int) -> int:
+        return int(slot.positions[index]) if index >= 0 else -1
+
+    def _available(self, position: int, chosen: List[int]) -> bool:
+        return self.uses[position] < self.max_uses and position not in chosen
+
+    def _resolve(
+        self,
+        slot: MealSlotColumns,
+        lo: int,
+        hi: int,
+        proposed: int,
+        target: float,
+        chosen: List[int],
+    ) -> int:
+        position = self._position(slot, proposed)
+        if position < 0 or not self._available(position, chosen):
+            position = self._redraw(slot, lo, hi, target, chosen)
+        self.uses[position] += 1
+        return position
+
+    def _redraw(self, slot: MealSlotColumns, lo: int, hi: int, target: float, chosen: List[int]) -> int:
+        if hi > lo:
+            for u in self.rng.random(REJECTION_TRIES):
+                index = int(slot.draw(np.array([lo]), np.array([hi]), np.array([u]))[0])
+                position = int(slot.positions[index])
+                if self._available(position, chosen):
+                    return position
+
+            window = slot.positions[lo:hi]
+            weights = slot.weights[lo:hi] * (self.uses[window] < self.max_uses)
+            if chosen:
+                weights = weights * ~np.isin(window, chosen)
+            total = weights.sum()
+            if total > 0:
+                index = int(np.searchsorted(np.cumsum(weights), self.rng.random() * total, side='right'))
+                return int(window[min(index, len(window) - 1)])
+
+        # Nothing usable in the calorie window: take the available recipe
+        # closest in calories and macros
+        available = self.uses[slot.positions] < self.max_uses
+        if chosen:
+            available &= ~np.isin(slot.positions, chosen)
+        if not available.any():
+            raise ValueError("Not enough recipes to fill the meal plan")
+        distance = ((slot.nutrients - slot.target_point(target)) ** 2).sum(axis=1)
+        distance = np.where(available, distance, np.inf)
+        return int(slot.positions[int(np.argmin(distance))])
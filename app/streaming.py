@@ -0,0 +1,36 @@
+import threading
+from typing import Callable, Iterator
+
+
+class ClaimedStream:
+    """A streamed response body whose cleanup runs exactly once.
+
+    Pass `body()` as the StreamingResponse content and `close_unstarted`
+    as its background task. Once the body has started, only the body's own
+    `finally` cleans up: after a disconnect the worker thread may still be
+    inside it, and cleaning up from another thread would race with it. The
+    background task cleans up only when the body never started.
+    """
+
+    def __init__(self, body: Callable[[], Iterator], cleanup: Callable[[], None]):
+        self._body = body
+        self._cleanup = cleanup
+        self._lock = threading.Lock()
+        self._claimed = False
+
+    def _claim(self) -> bool:
+        with self._lock:
+            claimed, self._claimed = self._claimed, True
+            return not claimed
+
+    def close_unstarted(self) -> None:
+        if self._claim():
+            self._cleanup()
+
+    def body(self) -> Iterator:
+        if not self._claim():
+            return
+        try:
+            yield from self._body()
+        finally:
+            self._cleanup()
@@ -0,0 +1,175 @@
+"""Meal plan generation benchmarks on synthetic in-memory catalogs.
+
+    python -m benchmarks --sizes 1000 10000 --days 7 30 365 --output bench.json
+
+Every scenario times one cold run (catalog indexes built from scratch),
+then warm runs until --repeat runs or --max-seconds is reached, then one
+more warm run under tracemalloc for allocation figures. Results are
+written as JSON; progress goes to stderr. No database is needed.
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import sys
+import time
+import tracemalloc
+from datetime import datetime
+from typing import Callable, List, Optional
+import numpy as np
+from app.services import MealPlanGenerator
+from .catalogs import StaticCatalog, synthetic_records
+
+TARGETS = ('python', 'numpy', 'calculate_daily_meals')
+START_DATE = datetime(2025, 1, 6)
+
+
+def legacy_planner(catalog: StaticCatalog, days: int, calories: int, prefs: List[str]) -> Callable[[int], None]:
+    # The router module builds its engine at import time; nothing connects
+    # until a session is opened, so any URL will do.
+    os.environ.setdefault('DATABASE_URL', 'sqlite://')
+    from app.routers.meal_plans import calculate_daily_meals
+
+    def run(seed: int) -> None:
+        random.seed(seed)
+        snapshot = catalog.snapshot(None)
+        for _ in range(days):
+            calculate_daily_meals(snapshot, calories, prefs)
+
+    return run
+
+
+def generator_planner(catalog: StaticCatalog, engine: str, days: int, calories: int, prefs: List[str]) -> Callable[[int], None]:
+    def run(seed: int) -> None:
+        MealPlanGenerator(None, catalog=catalog, engine=engine, seed=seed).plan_days(START_DATE, days, calories, prefs)
+
+    return run
+
+
+def percentiles(samples: List[float]) -> dict:
+    ms = np.array(samples) * 1000
+    return {
+        'min': float(ms.min()),
+        'p50': float(np.percentile(ms, 50)),
+        'p90': float(np.percentile(ms, 90)),
+        'p99': float(np.percentile(ms, 99)),
+        'max': float(ms.max()),
+        'mean': float(ms.mean()),
+    }
+
+
+def measure_allocations(run: Callable[[int], None], seed: int) -> dict:
+    tracemalloc.start()
+    try:
+        before = tracemalloc.take_snapshot()
+        tracemalloc.reset_peak()
+        baseline = tracemalloc.get_traced_memory()[0]
+        run(seed)
+        peak = tracemalloc.get_traced_memory()[1]
+        after = tracemalloc.take_snapshot()
+    finally:
+        tracemalloc.stop()
+    grown = [s for s in after.compare_to(before, 'filename') if s.size_diff > 0]
+    return {
+        'peak_bytes': peak - baseline,
+        'retained_bytes': sum(s.size_diff for s in grown),
+        'retained_blocks': sum(max(s.count_diff, 0) for s in grown),
+    }
+
+
+def run_scenario(catalog: StaticCatalog, target: str, days: int, args) -> dict:
+    result = {
+        'target': target,
+        'catalog_size': len(catalog.snapshot(None).records),
+        'days': days,
+        'target_calories': args.calories,
+        'dietary_preferences': args.dietary_preferences,
+    }
+    if target == 'calculate_daily_meals':
+        run = legacy_planner(catalog, days, args.calories, args.dietary_preferences)
+    else:
+        run = generator_planner(catalog, target, days, args.calories, args.dietary_preferences)
+
+    # Cold: indexes derived from the snapshot are rebuilt on first use
+    catalog.invalidate()
+    started = time.perf_counter()
+    try:
+        run(args.seed)
+    except ValueError as e:
+        result['error'] = str(e)
+        return result
+    result['cold_ms'] = (time.perf_counter() - started) * 1000
+
+    samples: List[float] = []
+    deadline = time.perf_counter() + args.max_seconds
+    for i in range(args.repeat):
+        started = time.perf_counter()
+        run(args.seed + i + 1)
+        samples.append(time.perf_counter() - started)
+        if time.perf_counter() > deadline:
+            break
+    result['repeats'] = len(samples)
+    result['latency_ms'] = percentiles(samples)
+    if args.memory:
+        result['allocations'] = measure_allocations(run, args.seed)
+    return result
+
+
+def max_rss_bytes() -> Optional[int]:
+    try:
+        import resource
+    except ImportError:  # Windows
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return rss if sys.platform == 'darwin' else rss * 1024
+
+
+def parse_args(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(prog='python -m benchmarks', description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000, 100000, 1000000])
+    parser.add_argument('--days', type=int, nargs='+', default=[7, 30, 365])
+    parser.add_argument('--targets', nargs='+', choices=TARGETS, default=list(TARGETS))
+    parser.add_argument('--calories', type=int, default=2000)
+    parser.add_argument('--dietary-preferences', nargs='*', default=[])
+    parser.add_argument('--repeat', type=int, default=20, help="warm runs per scenario")
+    parser.add_argument('--max-seconds', type=float, default=10.0, help="stop warm runs of a scenario after this long")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--no-memory', dest='memory', action='store_false', help="skip the tracemalloc run")
+    parser.add_argument('--output', help="write JSON here instead of stdout")
+    return parser.parse_args(argv)
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    args = parse_args(argv)
+    results = []
+    for size in args.sizes:
+        started = time.perf_counter()
+        catalog = StaticCatalog(synthetic_records(size, seed=args.seed))
+        print(f"catalog of {size} recipes built in {time.perf_counter() - started:.1f}s", file=sys.stderr)
+        for target in args.targets:
+            for days in args.days:
+                result = run_scenario(catalog, target, days, args)
+                results.append(result)
+                summary = result.get('error') or f"p50 {result['latency_ms']['p50']:.2f} ms over {result['repeats']} runs"
+                print(f"  {target} {days} days: {summary}", file=sys.stderr)
+
+    report = {
+        'created_at': datetime.utcnow().isoformat(),
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'platform': platform.platform(),
+        'max_rss_bytes': max_rss_bytes(),
+        'results': results,
+    }
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+    else:
+        json.dump(report, sys.stdout, indent=2)
+        print()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,79 @@
+import json
+from pathlib import Path
+from typing import List, Sequence
+import numpy as np
+from sqlalchemy.orm import Session
+from app.services import CatalogSnapshot, RecipeCatalog, RecipeRecord
+
+FIXTURES = Path(__file__).resolve().parent.parent / 'app' / 'fixtures'
+# recipes2.json gives the macro and meal weight shape; recipes_al.json is
+# the only fixture with calories filled in and dietary tags
+TEMPLATE_FILES = ('recipes2.json', 'recipes_al.json')
+# Log-normal spread applied to each template's macros
+MACRO_JITTER = 0.25
+
+
+def atwater_calories(protein: float, carbs: float, fats: float) -> float:
+    return 4 * protein + 4 * carbs + 9 * fats
+
+
+def load_templates(files: Sequence[str] = TEMPLATE_FILES) -> List[dict]:
+    templates = []
+    for name in files:
+        with open(FIXTURES / name, encoding='utf-8') as f:
+            templates.extend(json.load(f))
+    return templates
+
+
+def synthetic_records(size: int, seed: int = 0, templates: Sequence[dict] = ()) -> List[RecipeRecord]:
+    """`size` recipe records resampled from the fixture recipes.
+
+    Each record copies a random template's meal weights and dietary tags
+    and jitters its macros; calories follow from the macros when the
+    template has none, as in recipes2.json.
+    """
+    templates = list(templates) or load_templates()
+    rng = np.random.default_rng(seed)
+    picked = rng.integers(0, len(templates), size)
+    jitter = rng.lognormal(0.0, MACRO_JITTER, (size, 3))
+
+    macros = np.array([[t['protein'], t['carbs'], t['fats']] for t in templates], dtype=np.float64)[picked] * jitter
+    template_calories = np.array([t['calories'] for t in templates], dtype=np.float64)[picked]
+    calories = np.where(
+        template_calories > 0,
+        template_calories * jitter.mean(axis=1),
+        atwater_calories(macros[:, 0], macros[:, 1], macros[:, 2])
+    ).round()
+
+    tags = [frozenset(t['dietary_tags']) for t in templates]
+    return [
+        RecipeRecord(
+            id=i + 1,
+            calories=float(calories[i]),
+            protein=float(macros[i, 0]),
+            carbs=float(macros[i, 1]),
+            fats=float(macros[i, 2]),
+            breakfast_weight=templates[t]['breakfast_weight'],
+            lunch_weight=templates[t]['lunch_weight'],
+            dinner_weight=templates[t]['dinner_weight'],
+            dietary_tags=tags[t],
+        )
+        for i, t in enumerate(picked.tolist())
+    ]
+
+
+class StaticCatalog(RecipeCatalog):
+    """Catalog that serves a fixed snapshot instead of reading the database."""
+
+    def __init__(self, records: List[RecipeRecord]):
+        super().__init__()
+        self._snapshot = CatalogSnapshot(self._version, records)
+
+    def invalidate(self) -> None:
+        # Drop the derived indexes but keep the records
+        with self._lock:
+            self._version += 1
+            self._snapshot = CatalogSnapshot(self._version, self._snapshot.records)
+
+    def snapshot(self, db: Session) -> CatalogSnapshot:
+        return self._snapshot
@@ -0,0 +1,60 @@
+import random
+import numpy as np
+import pytest
+from app.services.nutrient_index import NutrientIndex, nutrient_matrix
+from app.services.recipe_catalog import RecipeRecord
+
+
+def random_records(size: int, seed: int):
+    rng = random.Random(seed)
+    return [
+        RecipeRecord(
+            id=i + 1,
+            calories=rng.uniform(50, 1200),
+            protein=rng.uniform(0, 80),
+            carbs=rng.uniform(0, 150),
+            fats=rng.uniform(0, 60),
+            breakfast_weight=1.0,
+            lunch_weight=1.0,
+            dinner_weight=1.0,
+            dietary_tags=frozenset(),
+        )
+        for i in range(size)
+    ]
+
+
+def brute_force(index: NutrientIndex, point, k: int, is_allowed=None):
+    """The k allowed records nearest to `point`, by a full scan."""
+    distances = ((nutrient_matrix(index.records) / index.scale - np.array(point)) ** 2).sum(axis=1)
+    order = [
+        i for i in np.argsort(distances, kind='stable')
+        if is_allowed is None or is_allowed(index.records[i])
+    ]
+    return [index.records[i] for i in order[:k]]
+
+
+@pytest.mark.parametrize('size', [1, 15, 17, 1000])
+@pytest.mark.parametrize('k', [1, 5, 40])
+def test_nearest_matches_brute_force(size, k):
+    index = NutrientIndex(random_records(size, seed=size))
+    rng = random.Random(k)
+    points = [index.target_point(target) for target in (100, 500, 2500)] + [
+        index.query_point(rng.uniform(0, 1500), rng.uniform(0, 90), rng.uniform(0, 160), rng.uniform(0, 70))
+        for _ in range(20)
+    ]
+    for point in points:
+        assert [r.id for r in index.nearest(point, k)] == [r.id for r in brute_force(index, point, k)]
+
+
+def test_nearest_with_a_filter_matches_brute_force():
+    index = NutrientIndex(random_records(500, seed=1))
+    is_allowed = lambda record: record.id % 3 == 0
+    for target in (200, 600, 1100):
+        point = index.target_point(target)
+        expected = brute_force(index, point, 10, is_allowed)
+        assert [r.id for r in index.nearest(point, 10, is_allowed)] == [r.id for r in expected]
+
+
+def test_nearest_on_an_empty_index():
+    index = NutrientIndex([])
+    assert index.nearest(index.target_point(500), 3) == []
@@ -0,0 +1,87 @@
+import math
+import random
+from collections import Counter
+from app.services.calorie_index import CalorieIndex
+from app.services.recipe_catalog import RecipeRecord
+from app.services.sampling import AliasTable, BucketTables, RecipeSampler
+
+DRAWS = 100_000
+
+
+def make_record(id: int, calories: float, lunch_weight: float) -> RecipeRecord:
+    return RecipeRecord(
+        id=id,
+        calories=calories,
+        protein=0.0,
+        carbs=0.0,
+        fats=0.0,
+        breakfast_weight=0.0,
+        lunch_weight=lunch_weight,
+        dinner_weight=0.0,
+        dietary_tags=frozenset(),
+    )
+
+
+def assert_proportional(counts: Counter, weights: dict, draws: int) -> None:
+    """Every key's share is within five standard deviations of its weight's share."""
+    total = sum(weights.values())
+    assert set(counts) <= {key for key, weight in weights.items() if weight > 0}
+    for key, weight in weights.items():
+        expected = weight / total
+        tolerance = 5 * math.sqrt(expected * (1 - expected) / draws) + 1e-9
+        assert abs(counts[key] / draws - expected) <= tolerance, key
+
+
+def lunch_catalog(size: int, seed: int) -> CalorieIndex:
+    rng = random.Random(seed)
+    records = [
+        make_record(i + 1, round(rng.uniform(100, 900)), rng.choice([0.0, 0.2, 0.5, 1.0]))
+        for i in range(size)
+    ]
+    return CalorieIndex(records, 'lunch')
+
+
+def test_alias_table_draws_in_proportion_to_weights():
+    weights = [1.0, 2.0, 3.0, 0.5, 10.0, 0.0, 4.0]
+    table = AliasTable(weights)
+    rng = random.Random(1)
+    counts = Counter(table.draw(rng) for _ in range(DRAWS))
+    assert_proportional(counts, dict(enumerate(weights)), DRAWS)
+
+
+def test_alias_table_with_one_entry():
+    table = AliasTable([0.3])
+    rng = random.Random(1)
+    assert {table.draw(rng) for _ in range(100)} == {0}
+
+
+def test_sampler_draws_the_window_in_proportion_to_weights():
+    index = lunch_catalog(400, seed=2)
+    sampler = RecipeSampler(BucketTables(index), random.Random(3))
+    weights = {r.id: r.lunch_weight for r in index.records if 450 <= r.calories <= 550}
+    counts = Counter(sampler.draw(500, 0.1, set()).id for _ in range(DRAWS))
+    assert_proportional(counts, weights, DRAWS)
+
+
+def test_sampler_skips_removed_and_excluded_recipes():
+    index = lunch_catalog(400, seed=4)
+    sampler = RecipeSampler(BucketTables(index), random.Random(5))
+    window = [r for r in index.records if 450 <= r.calories <= 550]
+    removed = {r.id for r in window[::2]}
+    excluded = {window[1].id}
+    for recipe_id in removed:
+        sampler.remove(recipe_id)
+
+    weights = {r.id: r.lunch_weight for r in window if r.id not in removed | excluded}
+    counts = Counter(sampler.draw(500, 0.1, excluded).id for _ in range(DRAWS))
+    assert_proportional(counts, weights, DRAWS)
+
+
+def test_sampler_returns_none_when_the_window_is_used_up():
+    index = lunch_catalog(200, seed=6)
+    sampler = RecipeSampler(BucketTables(index), random.Random(7))
+    for r in index.records:
+        if 450 <= r.calories <= 550:
+            sampler.remove(r.id)
+    assert sampler.draw(500, 0.1, set()) is None
+    assert sampler.draw(5000, 0.1, set()) is None
@@ -0,0 +1,166 @@
+from datetime import datetime, timedelta
+import pytest
+from sqlalchemy import create_engine, insert
+from sqlalchemy.orm import Session
+from sqlalchemy.pool import StaticPool
+from app import models
+from app.services.shopping import apply_deltas, ingredient_deltas, ingredient_totals, totals_by_key
+
+START = datetime(2026, 1, 1)
+
+
+@pytest.fixture
+def db():
+    engine = create_engine('sqlite://', poolclass=StaticPool, connect_args={'check_same_thread': False})
+    models.Base.metadata.create_all(engine)
+    with Session(engine) as session:
+        yield session
+    engine.dispose()
+
+
+@pytest.fixture
+def plan(db):
+    """A three-day plan over recipes whose ingredients are written in mixed units."""
+    flour = models.Ingredient(name='Flour', category='Baking', base_unit='g')
+    milk = models.Ingredient(name='Milk', category='Dairy', base_unit='ml', density=1.03)
+    eggs = models.Ingredient(name='Eggs', category='Dairy', base_unit='unit', piece_weight=50)
+    salt = models.Ingredient(name='Salt', category='Spices', base_unit='g')
+    db.add_all([flour, milk, eggs, salt])
+    db.flush()
+
+    def recipe(name, servings, *lines):
+        db_recipe = models.Recipe(name=name, servings=servings, instructions='-')
+        db.add(db_recipe)
+        db.flush()
+        for ingredient, quantity, unit in lines:
+            db.add(models.RecipeIngredient(recipe_id=db_recipe.id, ingredient_id=ingredient.id, quantity=quantity, unit=unit))
+        return db_recipe
+
+    pancakes = recipe('Pancakes', 4, (flour, 0.25, 'kg'), (milk, 2, 'cup'), (eggs, 2, 'pcs'), (salt, 1, 'tsp'))
+    bread = recipe('Bread', 8, (flour, 500, 'g'), (milk, 0.3, 'l'), (salt, 10, 'g'))
+    omelette = recipe('Omelette', 1, (eggs, 150, 'g'), (milk, 3, 'tbsp'))
+
+    meal_plan = models.MealPlan(start_date=START, end_date=START + timedelta(days=3))
+    db.add(meal_plan)
+    db.flush()
+    for day, (recipe_id, meal_type, servings) in enumerate([
+        (pancakes.id, 'breakfast', 2),
+        (bread.id, 'lunch', 3),
+        (omelette.id, 'breakfast', 1),
+        (pancakes.id, 'breakfast', 4),
+    ]):
+        db.add(models.MealPlanEntry(
+            meal_plan_id=meal_plan.id, recipe_id=recipe_id, date=START + timedelta(days=day % 3),
+            meal_type=meal_type, servings=servings
+        ))
+    db.flush()
+
+    shopping_list = models.ShoppingList(meal_plan_id=meal_plan.id, created_at=START, status='active')
+    db.add(shopping_list)
+    db.flush()
+    db.execute(insert(models.ShoppingListItem), [
+        {
+            'shopping_list_id': shopping_list.id,
+            'ingredient_id': row.ingredient_id,
+            'quantity': row.quantity,
+            'unit': row.unit,
+            'category': row.category,
+            'status': 'pending',
+        }
+        for row in plan_totals(db, meal_plan.id)
+    ])
+    db.commit()
+    return meal_plan, shopping_list, {'pancakes': pancakes, 'bread': bread, 'omelette': omelette}
+
+
+def plan_totals(db, meal_plan_id):
+    return ingredient_totals(db, models.MealPlanEntry.meal_plan_id == meal_plan_id)
+
+
+def list_items(db, shopping_list_id):
+    return {
+        (item.ingredient_id, item.unit): item
+        for item in db.query(models.ShoppingListItem).filter(models.ShoppingListItem.shopping_list_id == shopping_list_id)
+    }
+
+
+def assert_list_matches_plan(db, meal_plan_id, shopping_list_id):
+    expected = totals_by_key(plan_totals(db, meal_plan_id))
+    items = list_items(db, shopping_list_id)
+    assert items.keys() == expected.keys()
+    for key, (quantity, category) in expected.items():
+        assert items[key].quantity == pytest.approx(quantity)
+        assert items[key].category == category
+
+
+def edit(db, meal_plan, change):
+    """Apply `change` to the plan and patch its lists with the resulting deltas."""
+    before = plan_totals(db, meal_plan.id)
+    change()
+    db.flush()
+    apply_deltas(db, meal_plan.id, ingredient_deltas(before, plan_totals(db, meal_plan.id)))
+    db.flush()
+    db.expire_all()
+
+
+def entries(db, meal_plan):
+    return db.query(models.MealPlanEntry).filter(models.MealPlanEntry.meal_plan_id == meal_plan.id).order_by(models.MealPlanEntry.id).all()
+
+
+def test_initial_totals_fold_units(db, plan):
+    meal_plan, shopping_list, _ = plan
+    items = list_items(db, shopping_list.id)
+    # Pancakes for 2 + 4 of 4 servings, bread for 3 of 8, an omelette
+    assert items[(1, 'g')].quantity == pytest.approx(1.5 * 250 + 3 / 8 * 500)
+    assert items[(2, 'ml')].quantity == pytest.approx(1.5 * 500 + 3 / 8 * 300 + 45)
+    assert items[(3, 'unit')].quantity == pytest.approx(1.5 * 2 + 3)
+    assert items[(4, 'g')].quantity == pytest.approx(3 / 8 * 10)
+    # A teaspoon of salt has no density to become grams
+    assert items[(4, 'ml')].quantity == pytest.approx(1.5 * 5)
+
+
+@pytest.mark.parametrize('change_name', ['servings', 'swap', 'add', 'delete', 'delete_all'])
+def test_apply_deltas_matches_a_full_recompute(db, plan, change_name):
+    meal_plan, shopping_list, recipes = plan
+
+    def change():
+        plan_entries = entries(db, meal_plan)
+        if change_name == 'servings':
+            plan_entries[1].servings = 8
+        elif change_name == 'swap':
+            plan_entries[0].recipe_id = recipes['omelette'].id
+        elif change_name == 'add':
+            db.add(models.MealPlanEntry(
+                meal_plan_id=meal_plan.id, recipe_id=recipes['bread'].id, date=START, meal_type='dinner', servings=2
+            ))
+        elif change_name == 'delete':
+            db.delete(plan_entries[2])
+        else:
+            for entry in plan_entries:
+                db.delete(entry)
+
+    edit(db, meal_plan, change)
+    assert_list_matches_plan(db, meal_plan.id, shopping_list.id)
+    assert db.get(models.ShoppingList, shopping_list.id).version == 2
+
+
+def test_apply_deltas_over_several_edits(db, plan):
+    meal_plan, shopping_list, recipes = plan
+    edit(db, meal_plan, lambda: setattr(entries(db, meal_plan)[0], 'servings', 1))
+    edit(db, meal_plan, lambda: db.delete(entries(db, meal_plan)[1]))
+    edit(db, meal_plan, lambda: setattr(entries(db, meal_plan)[0], 'recipe_id', recipes['bread'].id))
+    assert_list_matches_plan(db, meal_plan.id, shopping_list.id)
+    assert db.get(models.ShoppingList, shopping_list.id).version == 4
+
+
+def test_apply_deltas_reopens_grown_items(db, plan):
+    meal_plan, shopping_list, recipes = plan
+    for item in list_items(db, shopping_list.id).values():
+        item.status = 'purchased'
+    db.flush()
+
+    edit(db, meal_plan, lambda: setattr(entries(db, meal_plan)[2], 'servings', 2))  # the omelette
+    statuses = {key: item.status for key, item in list_items(db, shopping_list.id).items()}
+    assert statuses[(2, 'ml')] == 'pending'
+    assert statuses[(3, 'unit')] == 'pending'
+    assert statuses[(1, 'g')] == 'purchased'